@@ -47,6 +47,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.instrumentation.InstrumentationMiddleware',
+    'core.nplusone.NPlusOneMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,6 +59,34 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Report the queries, database time and serializer and render time of
+# every request in Server-Timing headers and core.instrumentation logs.
+REQUEST_METRICS = bool(int(os.environ.get('REQUEST_METRICS', 0)))
+
+# Requests running one statement shape N_PLUS_ONE_THRESHOLD times or more
+# are reported as likely N+1 queries. 'log' warns for a sample of
+# N_PLUS_ONE_SAMPLE_RATE of the requests, 'raise' fails them, as the test
+# runner does, and '' turns detection off. Views in
+# N_PLUS_ONE_ALLOWED_VIEWS, such as 'RecipeViewSet.list', are skipped.
+N_PLUS_ONE_MODE = os.environ.get('N_PLUS_ONE_MODE', 'log')
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+N_PLUS_ONE_SAMPLE_RATE = float(
+    os.environ.get('N_PLUS_ONE_SAMPLE_RATE', 0.01)
+)
+N_PLUS_ONE_ALLOWED_VIEWS = []
+
+# Fraction of the requests of each view run under cProfile, overridden per
+# view by PROFILE_VIEW_SAMPLE_RATES, such as {'RecipeViewSet.list': 0.05}.
+# Requests with an X-Profile header signed by profile_report --token in the
+# last PROFILE_TOKEN_MAX_AGE seconds are always profiled. Stats files go to
+# PROFILE_DIR, for profile_report to aggregate.
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_VIEW_SAMPLE_RATES = {}
+PROFILE_TOKEN_MAX_AGE = int(os.environ.get('PROFILE_TOKEN_MAX_AGE', 3600))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/vol/web/profiles')
+
+TEST_RUNNER = 'core.testing.TestRunner'
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -91,6 +122,35 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Seconds list responses stay cached, 0 disables the response cache.
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300))
+# Seconds an invalidated list response may be served while another request
+# regenerates it, 0 makes every request wait for a fresh response.
+RESPONSE_CACHE_STALE = int(os.environ.get('RESPONSE_CACHE_STALE', 0))
+
+# Seconds authentication tokens stay in the shared cache and in the
+# per-process LRU, which holds at most TOKEN_CACHE_SIZE tokens. Revoked
+# tokens may authenticate for TOKEN_CACHE_LOCAL_TTL seconds in other
+# processes. Tokens are only shared when CACHES is not process-local,
+# unlike the LocMemCache default.
+TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 300))
+TOKEN_CACHE_LOCAL_TTL = int(os.environ.get('TOKEN_CACHE_LOCAL_TTL', 5))
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 1024))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -109,6 +169,17 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Hasher of new passwords, existing ones are rehashed with it on login.
+# Either 'default' for the first of PASSWORD_HASHERS or an algorithm name.
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'default')
+# Worker processes hashing passwords, 0 hashes in the request thread, and
+# hashes that may wait for a worker before requests get a 503.
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', 2))
+PASSWORD_HASHING_QUEUE = int(os.environ.get('PASSWORD_HASHING_QUEUE', 16))
+PASSWORD_HASHING_TIMEOUT = float(
+    os.environ.get('PASSWORD_HASHING_TIMEOUT', 10)
+)
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
@@ -133,6 +204,26 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Header handing media transfers to the front proxy once their owner is
+# checked, X-Accel-Redirect for nginx or X-Sendfile for Apache and
+# lighttpd. Empty serves media from Python. nginx serves the files of
+# MEDIA_ROOT from the internal location MEDIA_ACCEL_PREFIX.
+MEDIA_SENDFILE_HEADER = os.environ.get('MEDIA_SENDFILE_HEADER', '')
+MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/internal-media/')
+
+# Threads resizing uploaded recipe images in each process, 0 leaves the
+# images to the process_images command.
+IMAGE_PROCESSING_THREADS = int(os.environ.get('IMAGE_PROCESSING_THREADS', 1))
+
+# Largest recipe image accepted, in bytes and in pixels. Uploads are
+# rejected as soon as they cross either limit.
+IMAGE_UPLOAD_MAX_BYTES = int(
+    os.environ.get('IMAGE_UPLOAD_MAX_BYTES', 10 * 1024 * 1024)
+)
+IMAGE_UPLOAD_MAX_PIXELS = int(
+    os.environ.get('IMAGE_UPLOAD_MAX_PIXELS', 40_000_000)
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -20,9 +20,10 @@ from drf_spectacular.views import (
 
 from django.contrib import admin
 from django.urls import path, include
-from django.conf.urls.static import static
 from django.conf import settings
 
+from recipe.views import RecipeImageView
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -34,10 +35,9 @@ urlpatterns = [
     ),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
+    path(
+        f'{settings.MEDIA_URL.lstrip("/")}<path:name>',
+        RecipeImageView.as_view(),
+        name='media',
+    ),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT,
-    )
\ No newline at end of file
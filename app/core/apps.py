@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.db import models
+
+        from core import signals  # noqa: F401
+        from core.lookups import Any
+
+        models.ForeignKey.register_lookup(Any)
+        models.IntegerField.register_lookup(Any)
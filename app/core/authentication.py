@@ -0,0 +1,177 @@
+"""
+Token authentication with cached token lookups.
+"""
+from collections import OrderedDict
+import hashlib
+import pickle
+import secrets
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+
+class LRUCache:
+    """Thread safe LRU cache of bounded size whose entries expire."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value of a live entry, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+
+            return value
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries."""
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        """Drop an entry if present."""
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        """Drop every entry."""
+        with self.lock:
+            self.entries.clear()
+
+
+def is_shared(backend):
+    """Return whether a cache backend is seen by every process."""
+    return not isinstance(backend, (LocMemCache, DummyCache))
+
+
+class TokenCache:
+    """Cache of tokens with their users by key.
+
+    Tokens are kept pickled in a small in-process LRU in front of the
+    shared cache, so every request gets its own user instance. Each
+    token has a generation in the shared cache, which invalidations
+    replace. Entries are stored with the generation read before their
+    token was, and only served while it is current, so a lookup racing
+    an invalidation never caches the stale token. Other processes drop
+    their LRU copy within TOKEN_CACHE_LOCAL_TTL seconds.
+
+    Process-local backends, such as the LocMemCache default, are only
+    used for generations, since invalidations would not reach the
+    other processes.
+    """
+
+    def __init__(self, backend=None):
+        self._backend = backend
+        self.local = LRUCache(
+            settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_LOCAL_TTL,
+        )
+
+    @property
+    def backend(self):
+        """Return the cache shared between processes."""
+        return self._backend or caches[DEFAULT_CACHE_ALIAS]
+
+    def cache_key(self, key):
+        """Return the shared cache key of a token, not revealing it."""
+        return f'token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+    def generation_key(self, cache_key):
+        """Return the shared cache key of the generation of a token."""
+        return f'{cache_key}:generation'
+
+    def generation(self, key):
+        """Return the generation to cache a token read from now with."""
+        return self.backend.get(self.generation_key(self.cache_key(key)))
+
+    def get(self, key):
+        """Return the cached token, or None."""
+        cache_key = self.cache_key(key)
+        data = self.local.get(cache_key)
+        if data is not None:
+            return pickle.loads(data)
+        if not is_shared(self.backend):
+            return None
+        generation_key = self.generation_key(cache_key)
+        values = self.backend.get_many([cache_key, generation_key])
+        entry = values.get(cache_key)
+        generation = values.get(generation_key)
+        if entry is None or entry[0] != generation:
+            return None
+        token = entry[1]
+        self.set_local(cache_key, generation, token)
+
+        return token
+
+    def set(self, token, generation):
+        """Cache a token with its user, read at a generation."""
+        cache_key = self.cache_key(token.key)
+        if is_shared(self.backend):
+            self.backend.set(
+                cache_key, (generation, token),
+                timeout=settings.TOKEN_CACHE_TTL,
+            )
+        self.set_local(cache_key, generation, token)
+
+    def set_local(self, cache_key, generation, token):
+        """Cache a token in the LRU, unless invalidated meanwhile."""
+        self.local.set(cache_key, pickle.dumps(token))
+        generation_key = self.generation_key(cache_key)
+        if self.backend.get(generation_key) != generation:
+            self.local.delete(cache_key)
+
+    def delete(self, *keys):
+        """Drop tokens from the caches, with a new generation each."""
+        cache_keys = [self.cache_key(key) for key in keys]
+        # Generations outlive the entries cached before them.
+        self.backend.set_many(
+            {
+                self.generation_key(cache_key): secrets.token_hex(8)
+                for cache_key in cache_keys
+            },
+            timeout=2 * settings.TOKEN_CACHE_TTL,
+        )
+        self.backend.delete_many(cache_keys)
+        for cache_key in cache_keys:
+            self.local.delete(cache_key)
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication reading tokens and users through a cache."""
+
+    def authenticate_credentials(self, key):
+        """Return the user and token of a key, cached after a lookup."""
+        token = token_cache.get(key)
+        if token is None:
+            generation = token_cache.generation(key)
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(token, generation)
+        elif not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+
+        return (token.user, token)
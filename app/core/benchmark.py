@@ -0,0 +1,67 @@
+"""
+Helpers for benchmarking code paths against the database.
+"""
+import statistics
+import time
+
+from django.db import connection
+
+
+scenarios = {}
+
+
+def register(name, atomic=True):
+    """Register a benchmark scenario under the given name.
+
+    A scenario is called with the command options and returns a list of
+    results from `measure`. Scenarios run in a transaction that is rolled
+    back afterwards unless they are registered with `atomic=False`.
+    """
+    def decorator(func):
+        func.atomic = atomic
+        scenarios[name] = func
+        return func
+
+    return decorator
+
+
+class QueryCounter:
+    """Count the queries run, as a database execute wrapper.
+
+    Unlike CaptureQueriesContext it keeps no log, so counts are not
+    capped by the length of connection.queries_log.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(label, func, repeat=5, rows=None):
+    """Return round trips and latency of calling func.
+
+    The first call counts queries; the timed calls run without the
+    counter so its overhead does not skew the latency.
+    """
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    result = {
+        'label': label,
+        'queries': counter.count,
+        'mean_ms': statistics.mean(timings) * 1000,
+        'min_ms': min(timings) * 1000,
+    }
+    if rows:
+        result['rows_per_sec'] = rows / statistics.mean(timings)
+
+    return result
@@ -0,0 +1,131 @@
+"""
+Password hashing offloaded to a bounded pool of processes.
+
+PBKDF2 and friends hold a request thread for tens to hundreds of
+milliseconds, so hashes are computed by PASSWORD_HASHING_WORKERS worker
+processes instead. At most PASSWORD_HASHING_QUEUE hashes wait for a free
+worker; beyond that callers get HashingUnavailable (503) right away
+rather than piling up. Zero workers hash inline.
+"""
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from rest_framework import exceptions, status
+
+
+class HashingUnavailable(exceptions.APIException):
+    """Raised when the hashing pool is full or not responding."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many password checks in progress, try again later.'
+    default_code = 'hashing_unavailable'
+    wait = 1
+
+
+class HashingPool:
+    """Run hashes in worker processes, rejecting work beyond the queue."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.workers = 0
+        self.slots = None
+
+    def get_executor(self, workers):
+        """Return the executor and its slots, started on first use."""
+        with self.lock:
+            if self.executor is None or self.workers != workers:
+                if self.executor is not None:
+                    self.executor.shutdown(wait=False, cancel_futures=True)
+                # Spawned workers only unpickle hashers, so they never
+                # inherit the database connections of the parent.
+                self.executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+                self.workers = workers
+                self.slots = threading.BoundedSemaphore(
+                    workers + settings.PASSWORD_HASHING_QUEUE
+                )
+
+            return self.executor, self.slots
+
+    def reset(self, executor):
+        """Shut down a broken executor so the next hash starts a new one.
+
+        Queued hashes are cancelled and the workers exit once their
+        current hash is done, rather than staying around for good.
+        """
+        executor.shutdown(wait=False, cancel_futures=True)
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+
+    def run(self, func, *args):
+        """Return func(*args), computed by a worker process."""
+        workers = settings.PASSWORD_HASHING_WORKERS
+        if not workers:
+            return func(*args)
+
+        executor, slots = self.get_executor(workers)
+        if not slots.acquire(blocking=False):
+            raise HashingUnavailable()
+        try:
+            future = executor.submit(func, *args)
+        except (BrokenProcessPool, RuntimeError):
+            slots.release()
+            self.reset(executor)
+            raise HashingUnavailable()
+        future.add_done_callback(lambda future: slots.release())
+        try:
+            return future.result(timeout=settings.PASSWORD_HASHING_TIMEOUT)
+        except (BrokenProcessPool, TimeoutError):
+            self.reset(executor)
+            raise HashingUnavailable()
+
+
+pool = HashingPool()
+
+
+def get_hasher():
+    """Return the hasher new and upgraded passwords use."""
+    return hashers.get_hasher(settings.PASSWORD_HASHER)
+
+
+def make_password(password):
+    """Return the hash of a password, computed in the pool."""
+    if password is None:
+        return hashers.make_password(None)
+    hasher = get_hasher()
+
+    return pool.run(hasher.encode, password, hasher.salt())
+
+
+def check_password(password, encoded, setter=None):
+    """Return whether a password matches its hash, verified in the pool.
+
+    Works as django.contrib.auth.hashers.check_password, calling setter
+    to rehash passwords whose hasher is not PASSWORD_HASHER or whose
+    parameters are outdated.
+    """
+    if password is None or not hashers.is_password_usable(encoded):
+        return False
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+
+    preferred = get_hasher()
+    hasher_changed = hasher.algorithm != preferred.algorithm
+    must_update = hasher_changed or preferred.must_update(encoded)
+    is_correct = pool.run(hasher.verify, password, encoded)
+    if not is_correct and not hasher_changed and must_update:
+        pool.run(hasher.harden_runtime, password, encoded)
+    if setter and is_correct and must_update:
+        setter(password)
+
+    return is_correct
@@ -0,0 +1,171 @@
+"""
+Per request SQL and timing instrumentation.
+
+With REQUEST_METRICS on, InstrumentationMiddleware counts the queries of
+each request and their time through connection.execute_wrapper, while
+serializers and renderers add the time they take. The totals go out as a
+Server-Timing header and a JSON log line on the core.instrumentation
+logger, labelled with the view action, such as RecipeViewSet.list.
+Phases may overlap: a query run while serializing counts in both.
+
+With REQUEST_METRICS off the middleware removes itself at startup, and
+nothing is wrapped, so requests pay nothing for it.
+"""
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+import json
+import logging
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from rest_framework import serializers
+
+
+logger = logging.getLogger(__name__)
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """Queries and time spent in each phase of a request."""
+    PHASES = ('db', 'serialize', 'render')
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.view = None
+        self.queries = 0
+        self.durations = dict.fromkeys(self.PHASES, 0.0)
+
+    def __call__(self, execute, sql, params, many, context):
+        """Time a query, as a database execute wrapper."""
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.durations['db'] += perf_counter() - start
+
+    def add(self, phase, duration):
+        """Add time spent in a phase."""
+        self.durations[phase] += duration
+
+    def as_dict(self):
+        """Return the metrics in milliseconds, with the total so far."""
+        fields = {'view': self.view, 'queries': self.queries}
+        for phase, duration in self.durations.items():
+            fields[f'{phase}_ms'] = round(duration * 1000, 3)
+        fields['total_ms'] = round((perf_counter() - self.start) * 1000, 3)
+
+        return fields
+
+    @staticmethod
+    def server_timing(fields):
+        """Return metrics from as_dict as a Server-Timing header value."""
+        entries = [
+            f'db;dur={fields["db_ms"]};desc="{fields["queries"]} queries"',
+            f'serialize;dur={fields["serialize_ms"]}',
+            f'render;dur={fields["render_ms"]}',
+            f'total;dur={fields["total_ms"]}',
+        ]
+
+        return ', '.join(entries)
+
+
+@contextmanager
+def timer(phase):
+    """Add the time spent in the block to a phase of the current request."""
+    metrics = current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(phase, perf_counter() - start)
+
+
+def timed_data(data):
+    """Return a serializer data property adding its time to serialize."""
+    def get_data(self):
+        with timer('serialize'):
+            return data.fget(self)
+
+    get_data.timed = True
+
+    return property(get_data)
+
+
+def install_serializer_timing():
+    """Time Serializer.data and ListSerializer.data, once per process.
+
+    Nested serializers render through to_representation, so only the
+    outermost serializer of a response is timed.
+    """
+    for serializer_class in (
+        serializers.Serializer,
+        serializers.ListSerializer,
+    ):
+        data = serializer_class.__dict__['data']
+        if not getattr(data.fget, 'timed', False):
+            serializer_class.data = timed_data(data)
+
+
+def view_name(view_func, method):
+    """Return the label of a view action, such as RecipeViewSet.list."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+class InstrumentationMiddleware:
+    """Report the queries and phase times of each request."""
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed()
+        install_serializer_timing()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+
+        fields = metrics.as_dict()
+        response['Server-Timing'] = metrics.server_timing(fields)
+        fields.update(
+            method=request.method,
+            path=request.path,
+            status=response.status_code,
+        )
+        logger.info(json.dumps(fields), extra={'metrics': fields})
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Label the metrics with the view action."""
+        metrics = current_metrics.get()
+        metrics.view = view_name(view_func, request.method.lower())
+
+    def process_template_response(self, request, response):
+        """Time rendering, which runs right after this hook."""
+        metrics = current_metrics.get()
+        start = perf_counter()
+        response.add_post_render_callback(
+            lambda response: metrics.add('render', perf_counter() - start)
+        )
+
+        return response
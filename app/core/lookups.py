@@ -0,0 +1,20 @@
+"""
+Custom database lookups.
+"""
+from django.db.models import Lookup
+
+
+class Any(Lookup):
+    """Match any value in a list, bound as a single array parameter."""
+    lookup_name = 'any'
+    prepare_rhs = False
+
+    def get_db_prep_lookup(self, value, connection):
+        """Pass the list through as one parameter."""
+        return '%s', [list(value)]
+
+    def as_sql(self, compiler, connection):
+        """Return `lhs = ANY(%s)`."""
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} = ANY({rhs})', lhs_params + rhs_params
@@ -0,0 +1,186 @@
+"""
+Django command to check the query plans of the hot API endpoints.
+"""
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from recipe import views
+
+
+HOT_TABLES = {
+    'core_recipe',
+    'core_tag',
+    'core_ingredient',
+    'core_recipe_tags',
+    'core_recipe_ingredients',
+}
+
+
+class Rollback(Exception):
+    """Raised to discard the seeded data."""
+
+
+class Command(BaseCommand):
+    """Django command to audit query plans against seeded data.
+
+    Plans are made with sequential scans and sorts disabled, so one only
+    shows up when no index can serve the query, whatever the data size.
+    """
+    help = 'EXPLAIN the queries of hot endpoints and flag scans and sorts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=100)
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--fail', action='store_true')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        issues = []
+        try:
+            with transaction.atomic():
+                user = self.seed(options)
+                for name, view, params in self.endpoints(user):
+                    issues += self.audit(name, view, params, user)
+                raise Rollback
+        except Rollback:
+            pass
+
+        if issues and options['fail']:
+            raise CommandError(f'{len(issues)} query plan issues found.')
+        if not issues:
+            self.stdout.write(self.style.SUCCESS('No query plan issues.'))
+
+    def seed(self, options):
+        """Create sample data and return the user to audit as."""
+        users = get_user_model().objects.bulk_create([
+            get_user_model()(email=f'audit-{i}@example.com', password='!')
+            for i in range(options['users'])
+        ])
+        recipes = Recipe.objects.bulk_create([
+            Recipe(
+                user=user,
+                title=f'Recipe {i}',
+                time_minutes=10,
+                price='5.00',
+            )
+            for user in users for i in range(options['recipes'])
+        ])
+        tags = Tag.objects.bulk_create([
+            Tag(user=user, name=f'Tag {i}')
+            for user in users for i in range(options['tags'])
+        ])
+        ingredients = Ingredient.objects.bulk_create([
+            Ingredient(user=user, name=f'Ingredient {i}')
+            for user in users for i in range(options['tags'])
+        ])
+        self.link(recipes, tags, Recipe.tags.through, 'tag_id')
+        self.link(
+            recipes, ingredients, Recipe.ingredients.through, 'ingredient_id',
+        )
+
+        with connection.cursor() as cursor:
+            for table in sorted(HOT_TABLES):
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(table)}')
+
+        return users[0]
+
+    def link(self, recipes, objs, through, column):
+        """Link each recipe to three objects of the same user."""
+        by_user = {}
+        for obj in objs:
+            by_user.setdefault(obj.user_id, []).append(obj.id)
+        rows = []
+        for i, recipe in enumerate(recipes):
+            ids = by_user.get(recipe.user_id, [])
+            for obj_id in {ids[(i + n) % len(ids)] for n in range(3)}:
+                rows.append(through(recipe_id=recipe.id, **{column: obj_id}))
+        through.objects.bulk_create(rows)
+
+    def endpoints(self, user):
+        """Return (name, view, query params) for each hot endpoint."""
+        tag_ids = list(
+            Tag.objects.filter(user=user).values_list('id', flat=True)[:2]
+        )
+        recipe = Recipe.objects.filter(user=user).first()
+        tags = ','.join(str(tag_id) for tag_id in tag_ids)
+        recipe_list = views.RecipeViewSet.as_view({'get': 'list'})
+        recipe_detail = views.RecipeViewSet.as_view({'get': 'retrieve'})
+        tag_list = views.TagViewSet.as_view({'get': 'list'})
+        ingredient_list = views.IngredientViewSet.as_view({'get': 'list'})
+
+        return [
+            ('RecipeViewSet.list', recipe_list, {}),
+            ('RecipeViewSet.list?render=db', recipe_list, {'render': 'db'}),
+            ('RecipeViewSet.list?tags', recipe_list, {'tags': tags}),
+            (
+                'RecipeViewSet.list?tags&match=all',
+                recipe_list,
+                {'tags': tags, 'match': 'all'},
+            ),
+            ('RecipeViewSet.retrieve', recipe_detail, {'pk': recipe.id}),
+            ('TagViewSet.list', tag_list, {}),
+            ('TagViewSet.list?assigned_only', tag_list, {'assigned_only': 1}),
+            ('IngredientViewSet.list', ingredient_list, {}),
+        ]
+
+    def audit(self, name, view, params, user):
+        """Run an endpoint and return the issues in its query plans."""
+        kwargs = {}
+        if 'pk' in params:
+            kwargs['pk'] = params.pop('pk')
+        request = APIRequestFactory().get('/', params)
+        force_authenticate(request, user=user)
+        with CaptureQueriesContext(connection) as ctx, \
+                override_settings(ALLOWED_HOSTS=['testserver']):
+            response = view(request, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+
+        issues = []
+        for query in ctx.captured_queries:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_sort = off')
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {query["sql"]}')
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            issues += [
+                f'{name}: {issue}' for issue in self.inspect(plan[0]['Plan'])
+            ]
+
+        if issues:
+            for issue in issues:
+                self.stdout.write(self.style.WARNING(issue))
+        else:
+            self.stdout.write(f'{name}: OK')
+
+        return issues
+
+    def inspect(self, node):
+        """Return the sequential scans and sorts in a plan node."""
+        issues = []
+        relation = node.get('Relation Name')
+        if node['Node Type'] == 'Seq Scan' and relation in HOT_TABLES:
+            issues.append(f'sequential scan on {relation}')
+        if node['Node Type'] in ('Sort', 'Incremental Sort'):
+            keys = ', '.join(node.get('Sort Key', []))
+            issues.append(f'sort on {keys}')
+        for child in node.get('Plans', []):
+            issues += self.inspect(child)
+
+        return issues
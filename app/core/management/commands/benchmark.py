@@ -0,0 +1,69 @@
+"""
+Django command to run registered benchmark scenarios.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.module_loading import autodiscover_modules
+
+from core import benchmark
+
+
+class Rollback(Exception):
+    """Raised to discard the data written by a scenario."""
+
+
+class Command(BaseCommand):
+    """Django command to benchmark code paths."""
+    help = 'Run benchmark scenarios and report round trips and latency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*')
+        parser.add_argument('--rows', type=int, default=30)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--list', action='store_true')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        autodiscover_modules('benchmarks')
+        if options['list']:
+            for name in sorted(benchmark.scenarios):
+                self.stdout.write(name)
+            return
+
+        names = options['scenarios'] or sorted(benchmark.scenarios)
+        unknown = set(names) - set(benchmark.scenarios)
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(unknown)}')
+
+        for name in names:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for result in self.run_scenario(name, options):
+                self.stdout.write(self.format_result(result))
+
+    def run_scenario(self, name, options):
+        """Run a scenario, rolling back what it wrote."""
+        func = benchmark.scenarios[name]
+        if not getattr(func, 'atomic', True):
+            return func(options)
+
+        results = []
+        try:
+            with transaction.atomic():
+                results = func(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+        return results
+
+    def format_result(self, result):
+        """Return a result as a single report line."""
+        line = (
+            f'  {result["label"]:<30} {result["queries"]:>6} queries '
+            f'{result["mean_ms"]:>10.2f} ms mean '
+            f'{result["min_ms"]:>10.2f} ms min'
+        )
+        if 'rows_per_sec' in result:
+            line += f' {result["rows_per_sec"]:>12.0f} rows/s'
+
+        return line
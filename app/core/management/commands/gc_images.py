@@ -0,0 +1,55 @@
+"""
+Django command to delete recipe image files no recipe references.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipe.cleanup import BATCH_SIZE, collect_orphans
+
+
+class Command(BaseCommand):
+    """Django command to garbage collect orphaned recipe images."""
+    help = 'Delete recipe image files no recipe references anymore.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace',
+            type=float,
+            default=24.0,
+            help='Hours a file must be left untouched before deletion.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report orphaned files without deleting them.',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep collecting every interval.',
+        )
+        parser.add_argument('--interval', type=float, default=3600.0)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        while True:
+            start = time.perf_counter()
+            stats = collect_orphans(
+                options['grace'] * 3600,
+                dry_run=options['dry_run'],
+                batch_size=options['batch_size'],
+            )
+            elapsed = time.perf_counter() - start
+            rate = stats['files'] / elapsed if elapsed else 0.0
+            verb = 'Would delete' if options['dry_run'] else 'Deleted'
+            self.stdout.write(
+                f'Scanned {stats["files"]} files '
+                f'({stats["bytes"] / 2 ** 20:.1f} MiB) in {elapsed:.2f} s, '
+                f'{rate:.0f} files/s. {verb} {stats["orphans"]} orphans '
+                f'({stats["freed"] / 2 ** 20:.1f} MiB).'
+            )
+            if not options['watch']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,81 @@
+"""
+Django command to bulk import recipes from a CSV or JSONL file.
+"""
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import RecipeImport
+from recipe.importer import (
+    BATCH_SIZE,
+    READERS,
+    RecipeImporter,
+    RecipeImportError,
+)
+
+
+class Command(BaseCommand):
+    """Django command to import recipes with Postgres COPY."""
+    help = 'Import recipes for a user from a CSV or JSONL file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--email', required=True)
+        parser.add_argument('--format', choices=sorted(READERS))
+        parser.add_argument('--resume', type=int, metavar='IMPORT_ID')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user with email {options["email"]}.')
+
+        if options['resume']:
+            try:
+                recipe_import = RecipeImport.objects.get(
+                    id=options['resume'],
+                    user=user,
+                )
+            except RecipeImport.DoesNotExist:
+                raise CommandError(f'No import {options["resume"]}.')
+            if recipe_import.status == RecipeImport.STATUS_DONE:
+                raise CommandError(f'Import {recipe_import.id} is done.')
+            self.stdout.write(
+                f'Resuming import {recipe_import.id} after '
+                f'{recipe_import.rows_done} rows.'
+            )
+        else:
+            recipe_import = RecipeImport.objects.create(user=user)
+            self.stdout.write(f'Started import {recipe_import.id}.')
+
+        fmt = options['format']
+        if not fmt:
+            fmt = os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if fmt not in READERS:
+            raise CommandError('Unknown format, use --format.')
+
+        importer = RecipeImporter(recipe_import, options['batch_size'])
+        with open(options['path'], newline='', encoding='utf-8') as source:
+            try:
+                importer.run(READERS[fmt](source), self.report)
+            except RecipeImportError as exc:
+                raise CommandError(
+                    f'Import {recipe_import.id} failed: {exc} '
+                    f'Fix the input and rerun with --resume '
+                    f'{recipe_import.id}.'
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {recipe_import.rows_done} rows '
+            f'({importer.rows_per_sec:.0f} rows/s).'
+        ))
+
+    def report(self, importer):
+        """Write the progress after each batch."""
+        self.stdout.write(
+            f'  {importer.recipe_import.rows_done:>10} rows '
+            f'{importer.rows_per_sec:>10.0f} rows/s'
+        )
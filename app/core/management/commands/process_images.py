@@ -0,0 +1,37 @@
+"""
+Django command to process recipe images waiting for their variants.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipe.images import process_pending
+
+
+class Command(BaseCommand):
+    """Django command to run queued recipe image jobs."""
+    help = 'Create the variants of uploaded recipe images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int)
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep polling for new jobs.',
+        )
+        parser.add_argument('--interval', type=float, default=2.0)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        while True:
+            start = time.perf_counter()
+            processed = process_pending(options['limit'])
+            if processed:
+                elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f'Processed {processed} images in {elapsed:.2f} s.'
+                )
+            if not options['watch']:
+                break
+            if not processed:
+                time.sleep(options['interval'])
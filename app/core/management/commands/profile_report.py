@@ -0,0 +1,58 @@
+"""
+Django command to report the hottest functions of profiled requests.
+"""
+import glob
+import os
+import pstats
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import PROFILE_HEADER, make_token
+
+
+class Command(BaseCommand):
+    """Django command aggregating the stats files of profiled requests."""
+    help = 'Report the functions profiled requests spent most time in.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--view',
+            help='Only aggregate requests of a view action, such as '
+                 'RecipeViewSet.list.',
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=25,
+            help='Number of functions to report.',
+        )
+        parser.add_argument(
+            '--sort',
+            choices=['cumulative', 'tottime', 'ncalls'],
+            default='cumulative',
+        )
+        parser.add_argument(
+            '--token',
+            action='store_true',
+            help=f'Print a signed {PROFILE_HEADER} header value instead.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['token']:
+            self.stdout.write(f'{PROFILE_HEADER}: {make_token()}')
+            return
+
+        pattern = f'{options["view"] or "*"}.*.pstats'
+        paths = sorted(glob.glob(os.path.join(settings.PROFILE_DIR, pattern)))
+        if not paths:
+            raise CommandError(f'No profiles in {settings.PROFILE_DIR}.')
+
+        views = {os.path.basename(path).rsplit('.', 3)[0] for path in paths}
+        self.stdout.write(
+            f'{len(paths)} profiled requests of {len(views)} view actions.'
+        )
+        stats = pstats.Stats(*paths, stream=self.stdout)
+        stats.strip_dirs().sort_stats(options['sort'])
+        stats.print_stats(options['top'])
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+
+DEDUPE_SQL = """
+CREATE TEMPORARY TABLE {table}_dedupe ON COMMIT DROP AS
+SELECT id, min(id) OVER (PARTITION BY user_id, lower(name)) AS keep_id
+FROM {table};
+DELETE FROM {table}_dedupe WHERE id = keep_id;
+INSERT INTO {links} (recipe_id, {column})
+SELECT DISTINCT l.recipe_id, d.keep_id
+FROM {links} l JOIN {table}_dedupe d ON d.id = l.{column}
+ON CONFLICT DO NOTHING;
+DELETE FROM {links} l USING {table}_dedupe d WHERE l.{column} = d.id;
+DELETE FROM {table} t USING {table}_dedupe d WHERE t.id = d.id;
+SET CONSTRAINTS ALL IMMEDIATE;
+SET CONSTRAINTS ALL DEFERRED;
+"""
+
+INDEX_SQL = (
+    'CREATE UNIQUE INDEX {table}_user_lower_name_uniq '
+    'ON {table} (user_id, lower(name));'
+)
+
+DROP_INDEX_SQL = 'DROP INDEX {table}_user_lower_name_uniq;'
+
+
+def unique_names(table, links, column):
+    """Merge duplicate names per user and add the unique index."""
+    names = {'table': table, 'links': links, 'column': column}
+    return [
+        migrations.RunSQL(
+            DEDUPE_SQL.format(**names),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            INDEX_SQL.format(**names),
+            reverse_sql=DROP_INDEX_SQL.format(**names),
+        ),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_auto_20241129_1527'),
+    ]
+
+    operations = [
+        *unique_names('core_tag', 'core_recipe_tags', 'tag_id'),
+        *unique_names(
+            'core_ingredient', 'core_recipe_ingredients', 'ingredient_id',
+        ),
+    ]
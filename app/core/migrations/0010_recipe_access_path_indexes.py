@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def drop_user_index(model_name, table, index):
+    """Drop the user_id index now covered by the composite index."""
+    return migrations.SeparateDatabaseAndState(
+        state_operations=[
+            migrations.AlterField(
+                model_name=model_name,
+                name='user',
+                field=models.ForeignKey(
+                    db_index=False,
+                    on_delete=django.db.models.deletion.CASCADE,
+                    to=settings.AUTH_USER_MODEL,
+                ),
+            ),
+        ],
+        database_operations=[
+            migrations.RunSQL(
+                f'DROP INDEX CONCURRENTLY IF EXISTS "{index}";',
+                reverse_sql=(
+                    f'CREATE INDEX CONCURRENTLY "{index}" '
+                    f'ON "{table}" ("user_id");'
+                ),
+            ),
+        ],
+    )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0009_unique_tag_ingredient_names'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(
+                fields=['user', '-id'],
+                name='core_recipe_user_id_idx',
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='tag',
+            index=models.Index(
+                fields=['user', '-name', '-id'],
+                name='core_tag_user_name_idx',
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='ingredient',
+            index=models.Index(
+                fields=['user', '-name', '-id'],
+                name='core_ingredient_user_name_idx',
+            ),
+        ),
+        drop_user_index(
+            'recipe', 'core_recipe', 'core_recipe_user_id_04234149',
+        ),
+        drop_user_index('tag', 'core_tag', 'core_tag_user_id_1b670500'),
+        drop_user_index(
+            'ingredient', 'core_ingredient', 'core_ingredient_user_id_73e97fe3',
+        ),
+    ]
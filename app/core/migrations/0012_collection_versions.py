@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:21
+
+import core.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_recipe_import'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectionVersion',
+            fields=[
+                ('user', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='+', serialize=False, to='core.user')),
+                ('version', models.BigIntegerField(default=core.models.new_version)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='version',
+            field=models.BigIntegerField(default=core.models.new_version, editable=False),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:34
+
+import core.models
+import core.storage
+from django.db import migrations, models
+
+
+# Images uploaded before content addressing keep their names, with one
+# blob per name counting the recipes already using it.
+COUNT_REFERENCES_SQL = '''
+INSERT INTO core_imageblob (name, size, ref_count, variants, updated_at)
+SELECT image, 0, count(*), '{}', now()
+FROM core_recipe
+WHERE image IS NOT NULL AND image <> ''
+GROUP BY image
+'''
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('size', models.PositiveBigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('variants', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(null=True, storage=core.storage.ContentAddressedStorage(), upload_to=core.models.recipe_image_file_path),
+        ),
+        migrations.RunSQL(
+            COUNT_REFERENCES_SQL,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:43
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.expressions
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0014_content_addressed_images'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['image'], name='core_recipe_image_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(django.db.models.expressions.Func(django.db.models.expressions.F('image_variants'), django.db.models.expressions.Value('$.*.*'), function='jsonb_path_query_array', output_field=models.JSONField()), name='core_recipe_variant_names_idx'),
+        ),
+    ]
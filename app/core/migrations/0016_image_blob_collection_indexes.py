@@ -0,0 +1,49 @@
+# Generated by Django 3.2.25 on 2026-10-18 21:01
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently,
+    RemoveIndexConcurrently,
+)
+from django.db import migrations, models
+import django.db.models.expressions
+
+
+# Blobs of images processed before variants were kept on blobs take the
+# variants of the recipe using them, so the garbage collector keeps them.
+COPY_VARIANTS_SQL = '''
+UPDATE core_imageblob
+SET variants = core_recipe.image_variants
+FROM core_recipe
+WHERE core_recipe.image = core_imageblob.name
+AND core_imageblob.variants = '{}'
+AND core_recipe.image_variants <> '{}'
+'''
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0015_recipe_image_reference_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            COPY_VARIANTS_SQL,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        RemoveIndexConcurrently(
+            model_name='recipe',
+            name='core_recipe_variant_names_idx',
+        ),
+        AddIndexConcurrently(
+            model_name='imageblob',
+            index=models.Index(condition=models.Q(('ref_count', 0)), fields=['updated_at'], name='core_imageblob_unused_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='imageblob',
+            index=django.contrib.postgres.indexes.GinIndex(django.db.models.expressions.Func(django.db.models.expressions.F('variants'), django.db.models.expressions.Value('$.*.*'), function='jsonb_path_query_array', output_field=models.JSONField()), name='core_imageblob_variants_idx'),
+        ),
+    ]
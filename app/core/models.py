@@ -1,25 +1,49 @@
 """
 Database models.
 """
+from contextlib import contextmanager
+from contextvars import ContextVar
 from enum import Enum
-import uuid
+import secrets
 import os
 
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.db import connection, models
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin,
 )
 
+from core import hashing
+from core.storage import content_storage
+
 
 def recipe_image_file_path(instance, filename):
-    """Generate file path for new recipe image."""
+    """Generate file path for new recipe image.
+
+    Only the directory and extension are kept, as the storage names the
+    file after the digest of its content.
+    """
     ext = os.path.splitext(filename)[1]
-    filename = f'{uuid.uuid4()}{ext}'
 
-    return os.path.join('uploads', 'recipe', filename)
+    return os.path.join('uploads', 'recipe', f'image{ext}')
+
+
+def image_variant_names(field='image_variants'):
+    """Return an expression listing the file names of image variants."""
+    return models.Func(
+        models.F(field),
+        models.Value('$.*.*'),
+        function='jsonb_path_query_array',
+        output_field=models.JSONField(),
+    )
+
+
+def new_version():
+    """Return a random version token."""
+    return secrets.randbits(63)
 
 class RoleKey(Enum):
     CK = 'CK'  # Cook
@@ -75,6 +99,20 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
+    def set_password(self, raw_password):
+        """Set the password, hashed in the hashing pool."""
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        """Return whether the password is correct, rehashing if needed."""
+        def setter(raw_password):
+            self.set_password(raw_password)
+            self._password = None
+            self.save(update_fields=['password'])
+
+        return hashing.check_password(raw_password, self.password, setter)
+
 class Address(models.Model):
     """Address for each user."""
     user = models.OneToOneField(
@@ -113,11 +151,95 @@ class Role(models.Model):
     def __str__(self):
         return f'{self.user}, {self.role_name}'
 
+
+class NamedAttributeManager(models.Manager):
+    """Manager for per-user attributes identified by a unique name.
+
+    Names are unique per user ignoring case, enforced by a unique index on
+    (user_id, lower(name)).
+    """
+    select_sql = (
+        'SELECT u.name, t.id, t.name FROM unnest(%s::text[]) AS u(name) '
+        'JOIN {table} t ON t.user_id = %s AND lower(t.name) = lower(u.name)'
+    )
+    insert_sql = (
+        'INSERT INTO {table} (user_id, name) '
+        'SELECT %s, u.name FROM unnest(%s::text[]) AS u(name) '
+        'ON CONFLICT (user_id, lower(name)) DO NOTHING RETURNING id, name'
+    )
+
+    def resolve_names(self, user, names):
+        """Return objects for the names, inserting any that are missing.
+
+        Missing names are inserted with ON CONFLICT DO NOTHING, so
+        concurrent writers never fail or create duplicates; names another
+        transaction inserted first are read back afterwards.
+        """
+        objs = self.resolve_name_map(user, names).values()
+
+        return list({obj.id: obj for obj in objs}.values())
+
+    def resolve_name_map(self, user, names):
+        """Return a dict mapping each name to its object.
+
+        Names differing only in case map to the same object.
+        """
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        found = {}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                self.select_sql.format(table=table),
+                [names, user.pk],
+            )
+            found.update((name, row) for name, *row in cursor.fetchall())
+            missing = [name for name in names if name not in found]
+            if missing:
+                cursor.execute(
+                    self.insert_sql.format(table=table),
+                    [user.pk, missing],
+                )
+                found.update((row[1], row) for row in cursor.fetchall())
+            missing = [name for name in names if name not in found]
+            if missing:
+                cursor.execute(
+                    self.select_sql.format(table=table),
+                    [missing, user.pk],
+                )
+                found.update((name, row) for name, *row in cursor.fetchall())
+
+        objs = {}
+        name_map = {}
+        for name in names:
+            obj_id, obj_name = found[name]
+            if obj_id not in objs:
+                objs[obj_id] = self.model.from_db(
+                    self.db, ['id', 'name', 'user_id'],
+                    [obj_id, obj_name, user.pk],
+                )
+            name_map[name] = objs[obj_id]
+
+        return name_map
+
+
 class Recipe(models.Model):
     """Recipe object."""
+    IMAGE_PROCESSING = 'processing'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = [
+        (IMAGE_PROCESSING, 'Processing'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    ]
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        db_index=False,
     )
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
@@ -126,7 +248,27 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(
+        null=True,
+        upload_to=recipe_image_file_path,
+        storage=content_storage,
+    )
+    image_status = models.CharField(
+        max_length=20,
+        choices=IMAGE_STATUS_CHOICES,
+        blank=True,
+    )
+    image_variants = models.JSONField(default=dict, blank=True)
+    version = models.BigIntegerField(default=new_version, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-id'],
+                name='core_recipe_user_id_idx',
+            ),
+            models.Index(fields=['image'], name='core_recipe_image_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -138,8 +280,19 @@ class Tag(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        db_index=False,
     )
 
+    objects = NamedAttributeManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-name', '-id'],
+                name='core_tag_user_name_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -150,13 +303,187 @@ class Ingredient(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        db_index=False,
     )
 
+    objects = NamedAttributeManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-name', '-id'],
+                name='core_ingredient_user_name_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
 
+class RecipeImport(models.Model):
+    """Bulk import of recipes, tracked so a failed run can resume."""
+    STATUS_RUNNING = 'running'
+    STATUS_FAILED = 'failed'
+    STATUS_DONE = 'done'
+    STATUS_CHOICES = [
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_DONE, 'Done'),
+    ]
 
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_RUNNING,
+    )
+    rows_done = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Import {self.id} ({self.status}, {self.rows_done} rows)'
+
+
+# Users whose collections are bumped at the end of a batch.
+pending_bumps = ContextVar('pending_bumps', default=None)
 
 
+class CollectionVersionManager(models.Manager):
+    """Manager for the collection versions of users."""
+    bump_sql = (
+        'INSERT INTO {table} (user_id, version) VALUES {rows} '
+        'ON CONFLICT (user_id) DO UPDATE SET version = EXCLUDED.version'
+    )
 
+    def bump(self, *user_ids):
+        """Give the collections of users new versions."""
+        pending = pending_bumps.get()
+        if pending is not None:
+            pending.update(user_ids)
+            return
+        if not user_ids:
+            return
+
+        # Rows are locked in user order, so concurrent bumps of the same
+        # users cannot deadlock.
+        user_ids = sorted(set(user_ids))
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        rows = ', '.join(['(%s, %s)'] * len(user_ids))
+        params = []
+        for user_id in user_ids:
+            params += [user_id, new_version()]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                self.bump_sql.format(table=table, rows=rows), params,
+            )
+
+    @contextmanager
+    def batch(self):
+        """Bump each user once when the block ends, not on every write.
+
+        Meant for writes to many objects that bump through signals, such
+        as deleting a queryset.
+        """
+        pending = set()
+        token = pending_bumps.set(pending)
+        try:
+            yield
+        finally:
+            pending_bumps.reset(token)
+        self.bump(*pending)
+
+    def get_version(self, user_id):
+        """Return the version of the collections of a user."""
+        version = self.filter(user_id=user_id).values_list(
+            'version', flat=True,
+        ).first()
+
+        return version or 0
+
+
+class CollectionVersion(models.Model):
+    """Version of the recipes, tags and ingredients of a user.
+
+    The version is replaced by a random token on every write to any of
+    them. Rows are not tied to the user by a constraint, so versions can
+    be bumped while the user is being deleted.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        primary_key=True,
+        related_name='+',
+    )
+    version = models.BigIntegerField(default=new_version)
+
+    objects = CollectionVersionManager()
+
+    def __str__(self):
+        return f'{self.user_id}: {self.version}'
+
+
+class ImageBlobManager(models.Manager):
+    """Manager counting the references to stored images."""
+    acquire_sql = (
+        'INSERT INTO {table} (name, size, ref_count, variants, updated_at) '
+        'VALUES (%s, %s, 1, %s, now()) '
+        'ON CONFLICT (name) DO UPDATE '
+        'SET ref_count = {table}.ref_count + 1, updated_at = now()'
+    )
+    release_sql = (
+        'UPDATE {table} SET ref_count = ref_count - 1, updated_at = now() '
+        'WHERE name = %s AND ref_count > 0'
+    )
+
+    def acquire(self, name, size):
+        """Count a new reference to a stored image."""
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                self.acquire_sql.format(table=table), [name, size, '{}'],
+            )
+
+    def release(self, name):
+        """Count a dropped reference to a stored image."""
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(self.release_sql.format(table=table), [name])
+
+
+class ImageBlob(models.Model):
+    """Image file shared by every recipe uploading the same content.
+
+    Names are content addressed, so recipes referencing the same name
+    share the file and its variants. Files of blobs left without
+    references are removed once nothing has used them for a while.
+    """
+    name = models.CharField(max_length=255, primary_key=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    variants = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ImageBlobManager()
+
+    class Meta:
+        indexes = [
+            # Blobs left without references, for the garbage collector.
+            models.Index(
+                fields=['updated_at'],
+                name='core_imageblob_unused_idx',
+                condition=models.Q(ref_count=0),
+            ),
+            GinIndex(
+                image_variant_names('variants'),
+                name='core_imageblob_variants_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.ref_count} references)'
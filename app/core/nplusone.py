@@ -0,0 +1,122 @@
+"""
+Detection of N+1 queries.
+
+NPlusOneMiddleware normalizes the statements of a request into shapes,
+with literals, placeholders and IN lists replaced, and reports shapes run
+N_PLUS_ONE_THRESHOLD times or more, which is how a query per row of a
+list shows up. With N_PLUS_ONE_MODE set to raise, as the test runner
+does, such requests fail with NPlusOneError. Set to log, a sample of
+N_PLUS_ONE_SAMPLE_RATE of the requests is checked and reported as a
+warning with the stack that ran the repeated statement. Views listed in
+N_PLUS_ONE_ALLOWED_VIEWS, by labels such as RecipeViewSet.list, are not
+reported.
+"""
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+import logging
+import random
+import re
+import traceback
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from core.instrumentation import view_name
+
+
+logger = logging.getLogger(__name__)
+
+current_shapes = ContextVar('current_shapes', default=None)
+
+STATEMENT_RE = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE)\b', re.I)
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b|%s")
+IN_LIST_RE = re.compile(r'\bIN \((?:\?, )*\?\)')
+STACK_LIMIT = 30
+
+
+class NPlusOneError(Exception):
+    """Raised for requests running one statement shape too many times."""
+
+
+def normalize(sql):
+    """Return the shape of a statement, or None for other commands."""
+    if not STATEMENT_RE.match(sql):
+        return None
+    shape = LITERAL_RE.sub('?', sql)
+
+    return IN_LIST_RE.sub('IN (...)', shape)
+
+
+class QueryShapes:
+    """Count the statement shapes of a request, as an execute wrapper."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.view = None
+        self.counts = Counter()
+        self.stacks = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        shape = normalize(sql)
+        if shape is not None:
+            self.counts[shape] += 1
+            if self.counts[shape] == self.threshold:
+                self.stacks[shape] = ''.join(
+                    traceback.format_stack(limit=STACK_LIMIT)[:-1]
+                )
+
+        return execute(sql, params, many, context)
+
+    def report(self):
+        """Return a report of the repeated shapes, or None if none were."""
+        if not self.stacks or self.view in settings.N_PLUS_ONE_ALLOWED_VIEWS:
+            return None
+        lines = []
+        for shape, stack in self.stacks.items():
+            lines.append(
+                f'{self.view} ran {self.counts[shape]} queries shaped\n'
+                f'  {shape}\nrepeated from\n{stack}'
+            )
+
+        return '\n'.join(lines)
+
+
+class NPlusOneMiddleware:
+    """Report requests repeating one statement shape, likely N+1 queries."""
+
+    def __init__(self, get_response):
+        if not settings.N_PLUS_ONE_MODE:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = settings.N_PLUS_ONE_MODE
+        if mode == 'log' and \
+                random.random() >= settings.N_PLUS_ONE_SAMPLE_RATE:
+            return self.get_response(request)
+
+        shapes = QueryShapes(settings.N_PLUS_ONE_THRESHOLD)
+        token = current_shapes.set(shapes)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(shapes))
+                response = self.get_response(request)
+        finally:
+            current_shapes.reset(token)
+
+        report = shapes.report()
+        if report is not None:
+            if mode == 'raise':
+                raise NPlusOneError(report)
+            logger.warning('Possible N+1 queries: %s', report)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Label the shapes with the view action, for the allowlist."""
+        shapes = current_shapes.get()
+        if shapes is not None:
+            shapes.view = view_name(view_func, request.method.lower())
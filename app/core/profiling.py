@@ -0,0 +1,131 @@
+"""
+Sampled profiling of API requests.
+
+ProfilingMiddleware runs a fraction of the requests of each view under
+cProfile and writes their stats to PROFILE_DIR, one .pstats file per
+request named after the view action, such as RecipeViewSet.list. The
+fraction is PROFILE_SAMPLE_RATE, or the rate PROFILE_VIEW_SAMPLE_RATES
+gives the view. Requests carrying a signed X-Profile header, as printed
+by profile_report --token, are always profiled and get the name of their
+file back in the same header. The profile_report command aggregates the
+files into a report of the hottest functions.
+
+With no sample rate set the middleware only checks for the header, so
+requests pay for profiling only when they are profiled.
+"""
+from contextvars import ContextVar
+import cProfile
+import logging
+import os
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+
+from core.instrumentation import view_name
+
+
+logger = logging.getLogger(__name__)
+
+current_profile = ContextVar('current_profile', default=None)
+
+PROFILE_HEADER = 'X-Profile'
+TOKEN_SALT = 'core.profiling'
+TOKEN_VALUE = 'profile'
+
+
+def make_token():
+    """Return a signed X-Profile header value."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(TOKEN_VALUE)
+
+
+def valid_token(token):
+    """Return whether an X-Profile header value is signed and unexpired."""
+    try:
+        value = signing.TimestampSigner(salt=TOKEN_SALT).unsign(
+            token, max_age=settings.PROFILE_TOKEN_MAX_AGE,
+        )
+    except signing.BadSignature:
+        return False
+
+    return value == TOKEN_VALUE
+
+
+def sample_rate(view):
+    """Return the fraction of the requests of a view to profile."""
+    return settings.PROFILE_VIEW_SAMPLE_RATES.get(
+        view, settings.PROFILE_SAMPLE_RATE,
+    )
+
+
+class RequestProfile:
+    """Profiling of one request, started once its view is known."""
+
+    def __init__(self, requested):
+        self.requested = requested
+        self.view = None
+        self.profiler = None
+
+    def start(self, view):
+        """Start profiling the request if requested or sampled."""
+        self.view = view
+        if not self.requested and random.random() >= sample_rate(view):
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler, such as a debugger, is active.
+            return
+        self.profiler = profiler
+
+    def stop(self):
+        """Stop profiling and return the name of the stats file, if any.
+
+        Returns None when the file cannot be written, which is logged.
+        """
+        if self.profiler is None:
+            return None
+        self.profiler.disable()
+        name = f'{self.view}.{int(time.time())}.{uuid.uuid4().hex[:8]}.pstats'
+        try:
+            os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+            self.profiler.dump_stats(os.path.join(settings.PROFILE_DIR, name))
+        except OSError:
+            # Profiling never fails the request it profiled.
+            logger.exception('Could not write the profile of %s', self.view)
+            return None
+
+        return name
+
+
+class ProfilingMiddleware:
+    """Profile sampled and requested requests into PROFILE_DIR."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.headers.get(PROFILE_HEADER)
+        profile = RequestProfile(token is not None and valid_token(token))
+        context_token = current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_profile.reset(context_token)
+            name = profile.stop()
+
+        if name is not None:
+            logger.info('Profiled %s into %s', profile.view, name)
+            if profile.requested:
+                response[PROFILE_HEADER] = name
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Start profiling, now the view action is known."""
+        profile = current_profile.get()
+        if profile is not None:
+            profile.start(view_name(view_func, request.method.lower()))
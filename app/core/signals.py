@@ -0,0 +1,164 @@
+"""
+Signal handlers keeping versions, cached tokens and image references
+current.
+
+Writes that skip model signals, such as bulk_create, bulk_update and raw
+SQL, bump the versions themselves.
+"""
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from core.authentication import token_cache
+from core.models import (
+    CollectionVersion,
+    ImageBlob,
+    Recipe,
+    Tag,
+    Ingredient,
+    User,
+    new_version,
+)
+
+
+# Image of a recipe loaded without it, read back when it is needed.
+UNKNOWN_IMAGE = object()
+
+
+def bump_recipes(recipes):
+    """Give the recipes of a queryset new versions."""
+    recipes.update(version=new_version())
+
+
+@receiver(pre_save, sender=Recipe)
+def set_recipe_version(sender, instance, **kwargs):
+    """Give a recipe a new version on every save."""
+    instance.version = new_version()
+
+
+@receiver(post_init, sender=Recipe)
+def remember_image(sender, instance, **kwargs):
+    """Remember the stored image of a recipe, to count its references."""
+    # Deferred fields are missing from __dict__ until they are loaded.
+    instance._stored_image = instance.__dict__.get('image', UNKNOWN_IMAGE)
+
+
+def load_stored_image(instance):
+    """Read back the stored image of a recipe unless it is known.
+
+    The image remembered at load time is trusted while the recipe still
+    holds it. Any other value, such as a new upload or one read by
+    refresh_from_db, is checked against the database.
+    """
+    image = instance.__dict__.get('image', UNKNOWN_IMAGE)
+    if getattr(image, 'name', image) != instance._stored_image \
+            or instance._stored_image is UNKNOWN_IMAGE:
+        instance._stored_image = Recipe.objects.filter(
+            pk=instance.pk,
+        ).values_list('image', flat=True).first()
+
+
+@receiver(pre_save, sender=Recipe)
+def load_replaced_image(sender, instance, **kwargs):
+    """Load the stored image of a recipe whose image may be replaced."""
+    if 'image' in instance.__dict__ and instance.pk is not None:
+        load_stored_image(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def count_image_references(sender, instance, created, **kwargs):
+    """Move the reference of a recipe to its new image."""
+    if 'image' not in instance.__dict__:
+        return
+    image = instance.image
+    name = image.name or None
+    stored = None if created else instance._stored_image or None
+    if name != stored:
+        if name:
+            ImageBlob.objects.acquire(name, image.size)
+        if stored:
+            ImageBlob.objects.release(stored)
+    instance._stored_image = name
+
+
+@receiver(pre_delete, sender=Recipe)
+def load_deleted_image(sender, instance, **kwargs):
+    """Load the stored image of a recipe about to be deleted."""
+    load_stored_image(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_image(sender, instance, **kwargs):
+    """Drop the reference of a deleted recipe to its image."""
+    if instance._stored_image:
+        ImageBlob.objects.release(instance._stored_image)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def bump_collection(sender, instance, **kwargs):
+    """Bump the collections of the owner of a changed object."""
+    CollectionVersion.objects.bump(instance.user_id)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def bump_linked_recipes(sender, instance, created=False, **kwargs):
+    """Bump the recipes rendering a renamed or deleted tag or ingredient."""
+    if not created:
+        bump_recipes(instance.recipe_set.all())
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def bump_links(sender, instance, action, reverse, pk_set, **kwargs):
+    """Bump the recipes and collections of changed links."""
+    if reverse:
+        # The instance is a tag or ingredient and pk_set holds recipes,
+        # which a clear only leaves to be found before it runs.
+        if action == 'pre_clear':
+            recipes = instance.recipe_set.all()
+        elif action in ('post_add', 'post_remove') and pk_set:
+            recipes = Recipe.objects.filter(pk__in=pk_set)
+        else:
+            return
+    elif action == 'post_clear' or \
+            action in ('post_add', 'post_remove') and pk_set:
+        recipes = Recipe.objects.filter(pk=instance.pk)
+    else:
+        return
+
+    bump_recipes(recipes)
+    CollectionVersion.objects.bump(instance.user_id)
+
+
+@receiver(post_delete, sender=Token)
+def drop_deleted_token(sender, instance, **kwargs):
+    """Stop authenticating with a deleted token."""
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=User)
+def drop_user_tokens(sender, instance, created, **kwargs):
+    """Drop the cached tokens of a changed user.
+
+    Deactivations and password changes take effect on the next request.
+    """
+    if not created:
+        token_cache.delete(*Token.objects.filter(
+            user=instance,
+        ).values_list('key', flat=True))
@@ -0,0 +1,101 @@
+"""
+Content addressed file storage.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming files by the SHA-256 of their content.
+
+    The directory and extension of a saved name are kept and the rest is
+    replaced by the digest, fanned out over two levels of directories so
+    none grows too large. Files with the same content share one name and
+    a name never changes content, so their URLs can be cached forever.
+    """
+    default_file_mode = 0o644
+
+    def get_available_name(self, name, max_length=None):
+        """Return the name unchanged, as the content picks the final one."""
+        return name
+
+    def content_name(self, name, digest):
+        """Return the name of a file with a digest saved as name."""
+        directory = posixpath.dirname(name.replace('\\', '/'))
+        ext = os.path.splitext(name)[1].lower()
+
+        return posixpath.join(
+            directory, digest[:2], digest[2:4], f'{digest}{ext}',
+        )
+
+    def touch(self, name):
+        """Mark a file as used now and return whether it exists.
+
+        Touched files are kept from the garbage collector for another
+        grace period.
+        """
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+
+        return True
+
+    def write_hashed(self, fd, content):
+        """Copy content to a file descriptor and return its digest."""
+        digest = hashlib.sha256()
+        with os.fdopen(fd, 'wb') as temp_file:
+            for chunk in content.chunks():
+                digest.update(chunk)
+                temp_file.write(chunk)
+
+        return digest.hexdigest()
+
+    def _save(self, name, content):
+        """Save a file under its digest, hashing it while it is copied.
+
+        Uploads already hashed on disk, which carry their digest as
+        sha256, are moved instead. The file is put next to its final
+        place and renamed there, so a name is never seen half written
+        and saving existing content only costs the copy and a touch.
+        """
+        directory = os.path.dirname(self.path(name))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            digest = getattr(content, 'sha256', None)
+            if digest and hasattr(content, 'temporary_file_path'):
+                os.close(fd)
+                file_move_safe(
+                    content.temporary_file_path(), temp_path,
+                    allow_overwrite=True,
+                )
+            else:
+                digest = self.write_hashed(fd, content)
+            name = self.content_name(name, digest)
+            path = self.path(name)
+            if self.touch(name):
+                os.unlink(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.chmod(
+                    temp_path,
+                    self.file_permissions_mode or self.default_file_mode,
+                )
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        return name
+
+
+content_storage = ContentAddressedStorage()
@@ -0,0 +1,13 @@
+"""
+Test runner for the project.
+"""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Test runner failing requests that run N+1 queries."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.N_PLUS_ONE_MODE = 'raise'
@@ -0,0 +1,144 @@
+"""
+Tests for cached token authentication.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import LRUCache, TokenCache, token_cache
+
+
+TAGS_URL = reverse('recipe:tag-list')
+ME_URL = reverse('user:me')
+
+
+class LRUCacheTests(TestCase):
+    """Test the in-process LRU cache."""
+
+    def test_evicts_least_recently_used(self):
+        """Test the cache keeps the most recently used entries."""
+        lru = LRUCache(maxsize=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('c'), 3)
+
+    def test_entries_expire(self):
+        """Test entries are dropped after their TTL."""
+        lru = LRUCache(maxsize=2, ttl=0)
+        lru.set('a', 1)
+
+        self.assertIsNone(lru.get('a'))
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test authenticating with cached tokens."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_cached(self):
+        """Test a cached token is authenticated without a query."""
+        self.client.get(ME_URL)
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        for query in ctx:
+            self.assertNotIn('authtoken_token', query['sql'])
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_deleted_token_rejected(self):
+        """Test a deleted token stops authenticating."""
+        self.client.get(TAGS_URL)
+
+        self.token.delete()
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """Test a deactivated user stops authenticating."""
+        self.client.get(TAGS_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_drops_token(self):
+        """Test changing the password drops the cached user."""
+        self.client.patch(ME_URL, {'password': 'newpass123'})
+
+        self.assertIsNone(token_cache.get(self.token.key))
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(
+            token_cache.get(self.token.key).user.check_password('newpass123')
+        )
+
+
+@override_settings(TOKEN_CACHE_LOCAL_TTL=0)
+class TokenCacheTests(TestCase):
+    """Test token caches of separate processes."""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123',
+        )
+        self.token = Token.objects.create(user=user)
+
+    @patch('core.authentication.is_shared', return_value=True)
+    def test_invalidation_reaches_other_processes(self, patched_is_shared):
+        """Test a token dropped by one process is dropped in others."""
+        shared = LocMemCache('shared', {})
+        first, second = TokenCache(shared), TokenCache(shared)
+        second.set(self.token, second.generation(self.token.key))
+        self.assertEqual(first.get(self.token.key), self.token)
+
+        first.delete(self.token.key)
+
+        self.assertIsNone(second.get(self.token.key))
+
+    @patch('core.authentication.is_shared', return_value=True)
+    def test_stale_token_not_cached(self, patched_is_shared):
+        """Test tokens read before an invalidation are not served."""
+        shared = LocMemCache('shared', {})
+        first, second = TokenCache(shared), TokenCache(shared)
+        generation = first.generation(self.token.key)
+
+        second.delete(self.token.key)
+        first.set(self.token, generation)
+
+        self.assertIsNone(first.get(self.token.key))
+        self.assertIsNone(second.get(self.token.key))
+
+    def test_process_local_caches_not_shared(self):
+        """Test process-local backends do not keep tokens past the LRU."""
+        first = TokenCache(LocMemCache('first', {}))
+        second = TokenCache(LocMemCache('second', {}))
+        second.set(self.token, second.generation(self.token.key))
+
+        first.delete(self.token.key)
+
+        self.assertIsNone(second.get(self.token.key))
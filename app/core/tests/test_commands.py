@@ -1,13 +1,35 @@
 """
 Test custom Django management commands.
 """
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch
+import os
+import tempfile
+import time
 
 from psycopg2 import OperationalError as Psycopg2OpError
 
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from core.benchmark import measure
+from core.models import ImageBlob, Recipe, RecipeImport
+from core.profiling import valid_token
+from core.storage import content_storage
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -31,4 +53,302 @@ class CommandTests(SimpleTestCase):
         call_command('wait_for_db')
 
         self.assertEqual(patched_check.call_count, 6)
-        patched_check.assert_called_with(databases=['default'])
\ No newline at end of file
+        patched_check.assert_called_with(databases=['default'])
+
+
+class BenchmarkCommandTests(TestCase):
+    """Test the benchmark command."""
+
+    def test_benchmark_recipe_create(self):
+        """Test benchmarking recipe creation reports each path."""
+        out = StringIO()
+
+        call_command(
+            'benchmark', 'recipe_create', rows=2, repeat=1, stdout=out,
+        )
+
+        self.assertIn('per-item get_or_create', out.getvalue())
+        self.assertIn('bulk resolver', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_recipe_list(self):
+        """Test benchmarking recipe lists reports rows per second."""
+        out = StringIO()
+
+        call_command(
+            'benchmark', 'recipe_list', rows=3, repeat=1, stdout=out,
+        )
+
+        self.assertIn('row reader (3 rows)', out.getvalue())
+        self.assertIn('database json (3 rows)', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_measure_counts_past_query_log(self):
+        """Test query counts are not capped by the query log length."""
+        def run_queries():
+            with connection.cursor() as cursor:
+                for _ in range(connection.queries_log.maxlen + 1):
+                    cursor.execute('SELECT 1')
+
+        result = measure('queries', run_queries, repeat=1)
+
+        self.assertEqual(result['queries'], connection.queries_log.maxlen + 1)
+
+    def test_benchmark_unknown_scenario(self):
+        """Test an unknown scenario raises an error."""
+        with self.assertRaises(CommandError):
+            call_command('benchmark', 'does_not_exist')
+
+
+class LoginBenchmarkCommandTests(TransactionTestCase):
+    """Test the login benchmark, which commits its user."""
+
+    def test_benchmark_user_login(self):
+        """Test benchmarking logins reports each hashing path."""
+        out = StringIO()
+
+        call_command('benchmark', 'user_login', rows=2, repeat=1, stdout=out)
+
+        self.assertIn('inline hashing (2 logins)', out.getvalue())
+        self.assertIn('hashing pool (2 logins)', out.getvalue())
+        self.assertFalse(get_user_model().objects.exists())
+
+
+class AuditIndexesCommandTests(TestCase):
+    """Test the audit_indexes command."""
+
+    def test_audit_indexes_hot_endpoints(self):
+        """Test hot endpoints have no sequential scans or sorts."""
+        out = StringIO()
+
+        call_command(
+            'audit_indexes', users=3, recipes=5, tags=4, fail=True, stdout=out,
+        )
+
+        self.assertIn('RecipeViewSet.list: OK', out.getvalue())
+        self.assertIn('TagViewSet.list: OK', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+
+
+class ImportRecipesCommandTests(TestCase):
+    """Test the import_recipes command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        fd, self.path = tempfile.mkstemp(suffix='.jsonl')
+        with os.fdopen(fd, 'w') as source:
+            for i in range(5):
+                source.write(
+                    f'{{"title": "Recipe {i}", "time_minutes": 5, '
+                    f'"price": "1.00", "tags": ["Tag {i % 2}"]}}\n'
+                )
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_import_recipes(self):
+        """Test importing recipes reports progress and rows per second."""
+        out = StringIO()
+
+        call_command(
+            'import_recipes', self.path, email=self.user.email,
+            batch_size=2, stdout=out,
+        )
+
+        self.assertIn('Imported 5 rows', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 5)
+        recipe_import = RecipeImport.objects.get(user=self.user)
+        self.assertEqual(recipe_import.status, RecipeImport.STATUS_DONE)
+
+    def test_import_recipes_resume(self):
+        """Test resuming an import skips the rows already loaded."""
+        recipe_import = RecipeImport.objects.create(
+            user=self.user,
+            status=RecipeImport.STATUS_FAILED,
+            rows_done=3,
+        )
+
+        call_command(
+            'import_recipes', self.path, email=self.user.email,
+            resume=recipe_import.id, stdout=StringIO(),
+        )
+
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('title', flat=True)),
+            ['Recipe 3', 'Recipe 4'],
+        )
+        recipe_import.refresh_from_db()
+        self.assertEqual(recipe_import.rows_done, 5)
+
+
+class GarbageCollectImagesCommandTests(TestCase):
+    """Test the gc_images command."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.recipe = Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price='1.00',
+        )
+        self.recipe.image.save('soup.png', ContentFile(b'image'))
+        mtime = time.time() - 48 * 3600
+        os.utime(self.recipe.image.path, (mtime, mtime))
+        self.variant = self.save_file('variants/card.webp', b'variant')
+        Recipe.objects.filter(id=self.recipe.id).update(
+            image_variants={'card': {'webp': self.variant}},
+        )
+        ImageBlob.objects.filter(name=self.recipe.image.name).update(
+            variants={'card': {'webp': self.variant}},
+        )
+        self.orphan = self.save_file('old.png', b'orphan')
+        self.young = self.save_file('young.png', b'young', age=0)
+
+    def save_file(self, name, content, age=48 * 3600):
+        """Save a file under the upload directory, aged by age seconds."""
+        name = content_storage.save(
+            f'uploads/recipe/{name}', ContentFile(content),
+        )
+        mtime = time.time() - age
+        os.utime(content_storage.path(name), (mtime, mtime))
+
+        return name
+
+    def test_gc_images_dry_run(self):
+        """Test a dry run reports orphans without deleting them."""
+        out = StringIO()
+
+        call_command('gc_images', dry_run=True, stdout=out)
+
+        self.assertIn('Scanned 4 files', out.getvalue())
+        self.assertIn('Would delete 1 orphans', out.getvalue())
+        self.assertTrue(content_storage.exists(self.orphan))
+
+    def test_gc_images(self):
+        """Test old unreferenced files are deleted with their blobs."""
+        ImageBlob.objects.acquire(self.orphan, 6)
+        ImageBlob.objects.release(self.orphan)
+        ImageBlob.objects.filter(name=self.orphan).update(
+            updated_at=timezone.now() - timedelta(hours=48),
+        )
+        out = StringIO()
+
+        call_command('gc_images', batch_size=2, stdout=out)
+
+        self.assertIn('Deleted 1 orphans', out.getvalue())
+        self.assertIn('files/s', out.getvalue())
+        self.assertFalse(content_storage.exists(self.orphan))
+        self.assertFalse(ImageBlob.objects.filter(name=self.orphan).exists())
+        for name in (self.recipe.image.name, self.variant, self.young):
+            self.assertTrue(content_storage.exists(name))
+
+    def test_gc_images_unused_blob(self):
+        """Test blobs unused for the grace period go with their variants."""
+        name = self.recipe.image.name
+        self.recipe.delete()
+        ImageBlob.objects.filter(name=name).update(
+            updated_at=timezone.now() - timedelta(hours=48),
+        )
+
+        call_command('gc_images', stdout=StringIO())
+
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+        self.assertFalse(content_storage.exists(name))
+        self.assertFalse(content_storage.exists(self.variant))
+
+    def test_gc_images_recently_unused_blob(self):
+        """Test blobs unused for less than the grace period are kept."""
+        name = self.recipe.image.name
+        self.recipe.delete()
+
+        call_command('gc_images', stdout=StringIO())
+
+        self.assertEqual(ImageBlob.objects.get(name=name).ref_count, 0)
+        self.assertTrue(content_storage.exists(name))
+        self.assertTrue(content_storage.exists(self.variant))
+
+    def test_gc_images_keeps_shared_variants(self):
+        """Test variants of an unused blob that another blob uses stay."""
+        name = self.recipe.image.name
+        other = self.save_file('other.png', b'other')
+        ImageBlob.objects.acquire(other, 5)
+        ImageBlob.objects.filter(name=other).update(
+            variants={'card': {'webp': self.variant}},
+        )
+        self.recipe.delete()
+        ImageBlob.objects.filter(name=name).update(
+            updated_at=timezone.now() - timedelta(hours=48),
+        )
+
+        call_command('gc_images', stdout=StringIO())
+
+        self.assertFalse(content_storage.exists(name))
+        self.assertTrue(content_storage.exists(self.variant))
+
+
+class ProfileReportCommandTests(TestCase):
+    """Test the profile_report command."""
+
+    def setUp(self):
+        profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(profile_dir.cleanup)
+        profile_settings = override_settings(
+            PROFILE_DIR=profile_dir.name,
+            PROFILE_SAMPLE_RATE=1,
+        )
+        profile_settings.enable()
+        self.addCleanup(profile_settings.disable)
+
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        ))
+        client.get('/api/recipe/tags/')
+        client.get('/api/recipe/tags/')
+        client.get('/api/recipe/ingredients/')
+
+    def test_profile_report(self):
+        """Test profiles are aggregated into the hottest functions."""
+        out = StringIO()
+
+        call_command('profile_report', top=5, stdout=out)
+
+        self.assertIn('3 profiled requests of 2 view actions', out.getvalue())
+        self.assertIn('cumulative', out.getvalue())
+        self.assertIn('list', out.getvalue())
+
+    def test_profile_report_view(self):
+        """Test reports can be limited to one view action."""
+        out = StringIO()
+
+        call_command('profile_report', view='TagViewSet.list', stdout=out)
+
+        self.assertIn('2 profiled requests of 1 view actions', out.getvalue())
+
+    def test_profile_report_no_profiles(self):
+        """Test an error is raised when there is nothing to report."""
+        with self.assertRaises(CommandError):
+            call_command('profile_report', view='MissingViewSet.list')
+
+    def test_profile_token(self):
+        """Test printing a signed header value for profiling requests."""
+        out = StringIO()
+
+        call_command('profile_report', token=True, stdout=out)
+
+        header, token = out.getvalue().strip().split(': ')
+        self.assertEqual(header, 'X-Profile')
+        self.assertTrue(valid_token(token))
@@ -0,0 +1,82 @@
+"""
+Tests for password hashing in the hashing pool.
+"""
+from unittest.mock import patch
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import hashing
+
+
+TOKEN_URL = reverse('user:token')
+
+
+class HashingTests(TestCase):
+    """Test hashing passwords in worker processes."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1)
+    def test_hash_in_pool(self):
+        """Test passwords hashed in the pool verify."""
+        encoded = hashing.make_password('testpass123')
+
+        self.assertTrue(encoded.startswith('pbkdf2_sha256$'))
+        self.assertTrue(hashing.check_password('testpass123', encoded))
+        self.assertFalse(hashing.check_password('wrong', encoded))
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1)
+    def test_full_pool_returns_503(self):
+        """Test logins are rejected while the hashing queue is full."""
+        get_user_model().objects.create_user('user@example.com', 'pass123')
+        full = threading.BoundedSemaphore(1)
+        full.acquire()
+
+        with patch.object(
+            hashing.pool, 'get_executor', return_value=(None, full),
+        ):
+            res = self.client.post(
+                TOKEN_URL, {'email': 'user@example.com', 'password': 'x'},
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '1')
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_TIMEOUT=0)
+    def test_timeout_shuts_down_executor(self):
+        """Test a timed out executor is shut down, not left running."""
+        pool = hashing.HashingPool()
+        executor, _ = pool.get_executor(1)
+
+        with patch.object(
+            executor, 'shutdown', wraps=executor.shutdown,
+        ) as shutdown, self.assertRaises(hashing.HashingUnavailable):
+            pool.run(time.sleep, 1)
+
+        shutdown.assert_called_once_with(wait=False, cancel_futures=True)
+        self.assertIsNone(pool.executor)
+
+    def test_login_rehashes_password(self):
+        """Test logging in rehashes passwords with PASSWORD_HASHER."""
+        user = get_user_model().objects.create_user('user@example.com')
+        user.password = make_password('pass123', hasher='pbkdf2_sha1')
+        user.save()
+
+        with override_settings(PASSWORD_HASHER='pbkdf2_sha256'):
+            res = self.client.post(
+                TOKEN_URL, {'email': user.email, 'password': 'pass123'},
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(user.check_password('pass123'))
@@ -0,0 +1,86 @@
+"""
+Tests for request instrumentation.
+"""
+from decimal import Decimal
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL."""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+@override_settings(REQUEST_METRICS=True)
+class InstrumentationTests(TestCase):
+    """Test reporting the queries and timings of requests."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Soup',
+            time_minutes=5,
+            price=Decimal('1.00'),
+        )
+
+    def get_logged(self, url):
+        """Request a URL and return the response and its metrics log."""
+        with self.assertLogs('core.instrumentation', 'INFO') as logs:
+            res = self.client.get(url)
+
+        self.assertEqual(len(logs.records), 1)
+        return res, json.loads(logs.records[0].getMessage())
+
+    def test_server_timing(self):
+        """Test responses carry their queries and timings."""
+        res, metrics = self.get_logged(detail_url(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        timing = res['Server-Timing']
+        self.assertIn(f'desc="{metrics["queries"]} queries"', timing)
+        for phase in ('db', 'serialize', 'render', 'total'):
+            self.assertIn(f'{phase};dur=', timing)
+
+    def test_log_view_action(self):
+        """Test the metrics are logged per view action."""
+        res, metrics = self.get_logged(detail_url(self.recipe.id))
+
+        self.assertEqual(metrics['view'], 'RecipeViewSet.retrieve')
+        self.assertEqual(metrics['status'], status.HTTP_200_OK)
+        self.assertGreater(metrics['queries'], 0)
+        self.assertGreater(metrics['db_ms'], 0)
+        self.assertGreater(metrics['serialize_ms'], 0)
+        self.assertGreater(metrics['render_ms'], 0)
+
+    def test_row_list_serialize_time(self):
+        """Test lists rendered from rows report their serialize time."""
+        res, metrics = self.get_logged(RECIPES_URL)
+
+        self.assertEqual(metrics['view'], 'RecipeViewSet.list')
+        self.assertGreater(metrics['serialize_ms'], 0)
+
+    @override_settings(REQUEST_METRICS=False)
+    def test_disabled(self):
+        """Test nothing is reported with metrics disabled."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        res = client.get(RECIPES_URL)
+
+        self.assertNotIn('Server-Timing', res)
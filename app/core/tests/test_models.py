@@ -1,13 +1,18 @@
 """
 Tests for models.
 """
-from unittest.mock import patch
 from decimal import Decimal
+from threading import Barrier, Thread
+import hashlib
+import tempfile
 
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth import get_user_model
 
 from core import models
+from core.storage import ContentAddressedStorage
 
 
 def create_user(email='user@example.com', password='testpass123'):
@@ -90,11 +95,117 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(ingredient), ingredient.name)
 
-    @patch('core.models.uuid.uuid4')
-    def test_recipe_file_name_uuid(self, mock_uuid):
-        """Test generating image path."""
-        uuid = 'test-uuid'
-        mock_uuid.return_value = uuid
+    def test_tag_names_unique_ignoring_case(self):
+        """Test a user cannot have two tags differing only in case."""
+        user = create_user()
+        models.Tag.objects.create(user=user, name='Vegan')
+
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name='VEGAN')
+
+    def test_same_tag_name_for_different_users(self):
+        """Test different users can use the same tag name."""
+        user1 = create_user()
+        user2 = create_user(email='user2@example.com')
+
+        models.Tag.objects.create(user=user1, name='Vegan')
+        models.Tag.objects.create(user=user2, name='Vegan')
+
+        self.assertEqual(models.Tag.objects.count(), 2)
+
+    def test_resolve_names(self):
+        """Test resolving names reuses existing rows ignoring case."""
+        user = create_user()
+        existing = models.Ingredient.objects.create(user=user, name='Salt')
+
+        objs = models.Ingredient.objects.resolve_names(
+            user, ['salt', 'Pepper', 'pepper'],
+        )
+
+        self.assertEqual([obj.name for obj in objs], ['Salt', 'Pepper'])
+        self.assertEqual(objs[0].id, existing.id)
+        self.assertEqual(models.Ingredient.objects.count(), 2)
+
+    def test_writes_bump_versions(self):
+        """Test writes give recipes and collections new versions."""
+        user = create_user()
+        versions = models.CollectionVersion.objects
+        self.assertEqual(versions.get_version(user.pk), 0)
+        recipe = models.Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=Decimal('1.00'),
+        )
+        tag = models.Tag.objects.create(user=user, name='Vegan')
+        recipe.tags.add(tag)
+        collection_version = versions.get_version(user.pk)
+        recipe.refresh_from_db()
+        recipe_version = recipe.version
+
+        tag.name = 'Vegetarian'
+        tag.save()
+
+        recipe.refresh_from_db()
+        self.assertNotEqual(recipe.version, recipe_version)
+        self.assertNotEqual(versions.get_version(user.pk), collection_version)
+
+    def test_delete_user_with_versions(self):
+        """Test deleting a user whose deletes bump its versions."""
+        user = create_user()
+        models.Tag.objects.create(user=user, name='Vegan')
+
+        user.delete()
+
+        self.assertFalse(models.Tag.objects.exists())
+
+    def test_recipe_file_path(self):
+        """Test generating image path keeps the directory and extension."""
         file_path = models.recipe_image_file_path(None, 'example.jpg')
 
-        self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
\ No newline at end of file
+        self.assertEqual(file_path, 'uploads/recipe/image.jpg')
+
+    def test_storage_names_files_by_content(self):
+        """Test files are saved once under the digest of their content."""
+        digest = hashlib.sha256(b'image').hexdigest()
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            storage = ContentAddressedStorage()
+            name = storage.save('uploads/recipe/a.JPG', ContentFile(b'image'))
+            again = storage.save('uploads/recipe/b.jpg', ContentFile(b'image'))
+            other = storage.save('uploads/recipe/c.jpg', ContentFile(b'other'))
+
+            path = f'uploads/recipe/{digest[:2]}/{digest[2:4]}/{digest}.jpg'
+            self.assertEqual(name, path)
+            self.assertEqual(again, name)
+            self.assertNotEqual(other, name)
+            with storage.open(name) as file:
+                self.assertEqual(file.read(), b'image')
+
+
+class ResolveNamesConcurrencyTests(TransactionTestCase):
+    """Test resolving names from concurrent transactions."""
+
+    def test_concurrent_resolve_names(self):
+        """Test concurrent writers share rows without errors."""
+        user = create_user()
+        names = [f'Tag {i}' for i in range(20)]
+        barrier = Barrier(4)
+        results, errors = [], []
+
+        def resolve():
+            try:
+                barrier.wait()
+                objs = models.Tag.objects.resolve_names(user, names)
+                results.append(sorted(obj.id for obj in objs))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [Thread(target=resolve) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(models.Tag.objects.count(), len(names))
+        self.assertTrue(all(ids == results[0] for ids in results))
@@ -0,0 +1,85 @@
+"""
+Tests for N+1 query detection.
+"""
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase, override_settings
+
+from core.models import Tag
+from core.nplusone import NPlusOneError, NPlusOneMiddleware, normalize
+from recipe.views import TagViewSet
+
+
+class NormalizeTests(TestCase):
+    """Test normalizing statements into shapes."""
+
+    def test_literals_replaced(self):
+        """Test statements differing in literals share a shape."""
+        self.assertEqual(
+            normalize("SELECT * FROM t WHERE id = 1 AND name = 'a''b'"),
+            normalize("SELECT * FROM t WHERE id = 22 AND name = 'c'"),
+        )
+
+    def test_in_lists_collapsed(self):
+        """Test IN lists of any length share a shape."""
+        self.assertEqual(
+            normalize('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            'SELECT * FROM t WHERE id IN (...)',
+        )
+
+    def test_other_commands_ignored(self):
+        """Test savepoints and other commands have no shape."""
+        self.assertIsNone(normalize('SAVEPOINT "s1_x1"'))
+
+
+@override_settings(N_PLUS_ONE_THRESHOLD=5)
+class NPlusOneMiddlewareTests(TestCase):
+    """Test reporting requests repeating a statement shape."""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123',
+        )
+        self.tag_ids = [
+            Tag.objects.create(user=user, name=f'Tag {i}').id
+            for i in range(5)
+        ]
+        self.request = RequestFactory().get('/api/recipe/tags/')
+        self.view = TagViewSet.as_view({'get': 'list'})
+
+    def run_request(self, queries):
+        """Run a request fetching tags one by one in a loop."""
+        def get_response(request):
+            middleware.process_view(request, self.view, (), {})
+            for tag_id in self.tag_ids[:queries]:
+                Tag.objects.filter(id=tag_id).first()
+
+        middleware = NPlusOneMiddleware(get_response)
+        return middleware(self.request)
+
+    @override_settings(N_PLUS_ONE_MODE='raise')
+    def test_repeated_queries_raise(self):
+        """Test a query per row fails the request."""
+        with self.assertRaisesRegex(NPlusOneError, 'TagViewSet.list ran 5'):
+            self.run_request(5)
+
+    @override_settings(N_PLUS_ONE_MODE='raise')
+    def test_below_threshold(self):
+        """Test repeats below the threshold are not reported."""
+        self.run_request(4)
+
+    @override_settings(N_PLUS_ONE_MODE='log', N_PLUS_ONE_SAMPLE_RATE=1.0)
+    def test_repeated_queries_logged(self):
+        """Test sampled requests are logged with the repeating stack."""
+        with self.assertLogs('core.nplusone', 'WARNING') as logs:
+            self.run_request(5)
+
+        self.assertIn('repeated from', logs.output[0])
+        self.assertIn('test_nplusone.py', logs.output[0])
+
+    @override_settings(
+        N_PLUS_ONE_MODE='raise',
+        N_PLUS_ONE_ALLOWED_VIEWS=['TagViewSet.list'],
+    )
+    def test_allowed_view(self):
+        """Test views in the allowlist are not reported."""
+        self.run_request(5)
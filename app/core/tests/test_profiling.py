@@ -0,0 +1,102 @@
+"""
+Tests for sampled request profiling.
+"""
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.test import TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.profiling import TOKEN_SALT, make_token
+
+TAGS_URL = '/api/recipe/tags/'
+
+
+class ProfilingMiddlewareTests(TestCase):
+    """Test profiling requests into stats files."""
+
+    def setUp(self):
+        self.client = APIClient()
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123',
+        )
+        self.client.force_authenticate(user)
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profile_dir.cleanup)
+        profile_settings = override_settings(
+            PROFILE_DIR=self.profile_dir.name,
+            PROFILE_SAMPLE_RATE=0,
+        )
+        profile_settings.enable()
+        self.addCleanup(profile_settings.disable)
+
+    def profiles(self):
+        """Return the names of the stats files written."""
+        return sorted(os.listdir(self.profile_dir.name))
+
+    def test_unsampled_request_not_profiled(self):
+        """Test requests are not profiled with no sample rate."""
+        res = self.client.get(TAGS_URL)
+
+        self.assertNotIn('X-Profile', res)
+        self.assertEqual(self.profiles(), [])
+
+    def test_sampled_request_profiled(self):
+        """Test sampled requests are profiled under their view action."""
+        with self.settings(PROFILE_SAMPLE_RATE=1):
+            self.client.get(TAGS_URL)
+
+        profiles = self.profiles()
+        self.assertEqual(len(profiles), 1)
+        self.assertTrue(profiles[0].startswith('TagViewSet.list.'))
+        self.assertTrue(profiles[0].endswith('.pstats'))
+
+    def test_view_sample_rate(self):
+        """Test per view rates override the sample rate."""
+        with self.settings(
+            PROFILE_SAMPLE_RATE=1,
+            PROFILE_VIEW_SAMPLE_RATES={'TagViewSet.list': 0},
+        ):
+            self.client.get(TAGS_URL)
+
+        self.assertEqual(self.profiles(), [])
+
+    def test_signed_header_profiled(self):
+        """Test requests with a signed header are profiled."""
+        res = self.client.get(TAGS_URL, HTTP_X_PROFILE=make_token())
+
+        self.assertEqual(self.profiles(), [res['X-Profile']])
+
+    def test_forged_header_not_profiled(self):
+        """Test headers with a bad signature are ignored."""
+        token = signing.TimestampSigner(
+            key='not-the-secret-key', salt=TOKEN_SALT,
+        ).sign('profile')
+
+        res = self.client.get(TAGS_URL, HTTP_X_PROFILE=token)
+
+        self.assertNotIn('X-Profile', res)
+        self.assertEqual(self.profiles(), [])
+
+    def test_expired_header_not_profiled(self):
+        """Test headers older than the token max age are ignored."""
+        with self.settings(PROFILE_TOKEN_MAX_AGE=-1):
+            self.client.get(TAGS_URL, HTTP_X_PROFILE=make_token())
+
+        self.assertEqual(self.profiles(), [])
+
+    def test_unwritable_profile_dir(self):
+        """Test requests succeed when their profile cannot be written."""
+        path = os.path.join(self.profile_dir.name, 'file')
+        open(path, 'w').close()
+
+        with self.settings(PROFILE_DIR=os.path.join(path, 'profiles')), \
+                self.assertLogs('core.profiling', 'ERROR'):
+            res = self.client.get(TAGS_URL, HTTP_X_PROFILE=make_token())
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Profile', res)
@@ -0,0 +1,160 @@
+"""
+Benchmark scenarios for the recipe APIs.
+"""
+from decimal import Decimal
+from itertools import count
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from rest_framework.renderers import JSONRenderer
+
+from core.benchmark import measure, register
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from recipe.planner import plan_queryset
+from recipe.readers import (
+    JSONReader,
+    ListReader,
+)
+from recipe.serializers import RecipeSerializer
+
+
+def create_benchmark_user(email):
+    """Create and return a user to own benchmark data."""
+    return get_user_model().objects.create_user(email=email)
+
+
+def recipe_payload(rows, prefix):
+    """Return a recipe payload with `rows` tags and ingredients."""
+    return {
+        'title': f'{prefix} recipe',
+        'time_minutes': 10,
+        'price': Decimal('5.00'),
+        'tags': [{'name': f'{prefix} tag {i}'} for i in range(rows)],
+        'ingredients': [
+            {'name': f'{prefix} ingredient {i}'} for i in range(rows)
+        ],
+    }
+
+
+def create_recipe_per_item(user, payload):
+    """Create a recipe resolving one tag and ingredient at a time."""
+    data = dict(payload)
+    tags = data.pop('tags')
+    ingredients = data.pop('ingredients')
+    recipe = Recipe.objects.create(user=user, **data)
+    for tag in tags:
+        tag_obj, created = Tag.objects.get_or_create(user=user, **tag)
+        recipe.tags.add(tag_obj)
+    for ingredient in ingredients:
+        ingredient_obj, created = Ingredient.objects.get_or_create(
+            user=user,
+            **ingredient,
+        )
+        recipe.ingredients.add(ingredient_obj)
+
+    return recipe
+
+
+def create_recipe_bulk(user, payload):
+    """Create a recipe through RecipeSerializer."""
+    context = {'request': SimpleNamespace(user=user)}
+    serializer = RecipeSerializer(data=payload, context=context)
+    serializer.is_valid(raise_exception=True)
+
+    return serializer.save(user=user)
+
+
+@register('recipe_create')
+def recipe_create(options):
+    """Compare per-item and bulk tag/ingredient resolution on create."""
+    user = create_benchmark_user('benchmark-create@example.com')
+    rows, repeat = options['rows'], options['repeat']
+    runs = count()
+
+    def per_item():
+        create_recipe_per_item(user, recipe_payload(rows, next(runs)))
+
+    def bulk():
+        create_recipe_bulk(user, recipe_payload(rows, next(runs)))
+
+    return [
+        measure('per-item get_or_create', per_item, repeat),
+        measure('bulk resolver', bulk, repeat),
+    ]
+
+
+def seed_recipes(user, rows, links=3):
+    """Create `rows` recipes, each linked to a few tags and ingredients."""
+    recipes = Recipe.objects.bulk_create([
+        Recipe(
+            user=user,
+            title=f'Recipe {i}',
+            time_minutes=10,
+            price=Decimal('5.50'),
+            link='http://example.com/recipe.pdf',
+        )
+        for i in range(rows)
+    ], batch_size=5000)
+    for name, model in (('tags', Tag), ('ingredients', Ingredient)):
+        objs = model.objects.bulk_create([
+            model(user=user, name=f'{name} {i}') for i in range(20)
+        ])
+        related = getattr(Recipe, name)
+        column = related.field.m2m_reverse_name()
+        related.through.objects.bulk_create([
+            related.through(
+                recipe_id=recipe.id,
+                **{column: objs[(i + n) % len(objs)].id},
+            )
+            for i, recipe in enumerate(recipes) for n in range(links)
+        ], batch_size=5000)
+
+    # Fresh tables have no statistics, which leads the planner to plans
+    # production never uses, such as scanning links by tag_id.
+    tables = [
+        model._meta.db_table for model in (
+            Recipe, Tag, Ingredient,
+            Recipe.tags.through, Recipe.ingredients.through,
+        )
+    ]
+    with connection.cursor() as cursor:
+        for table in tables:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(table)}')
+
+
+@register('recipe_list')
+def recipe_list(options):
+    """Compare RecipeSerializer, the row reader and database JSON.
+
+    Run with --rows 1000, 10000 and 100000 to compare at each scale.
+    """
+    user = create_benchmark_user('benchmark-list@example.com')
+    rows, repeat = options['rows'], options['repeat']
+    seed_recipes(user, rows)
+    queryset = Recipe.objects.filter(user=user).order_by('-id')
+    renderer = JSONRenderer()
+
+    def serializer_path():
+        serializer = RecipeSerializer()
+        recipes = plan_queryset(queryset, 'list', serializer)
+        renderer.render(RecipeSerializer(recipes, many=True).data)
+
+    def reader_path():
+        reader = ListReader.for_serializer(RecipeSerializer())
+        renderer.render(reader.render(list(reader.queryset(queryset))))
+
+    def database_path():
+        reader = JSONReader.for_serializer(RecipeSerializer())
+        reader.render(list(reader.queryset(queryset))).encode()
+
+    return [
+        measure(f'serializer ({rows} rows)', serializer_path, repeat, rows),
+        measure(f'row reader ({rows} rows)', reader_path, repeat, rows),
+        measure(f'database json ({rows} rows)', database_path, repeat, rows),
+    ]
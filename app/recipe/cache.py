@@ -0,0 +1,83 @@
+"""
+Response cache for the recipe list APIs.
+
+Entries are keyed by user, view, action and normalized query parameters,
+and hold the collection version they were rendered at. Writes replace the
+version through the model signals, so an entry is fresh exactly while its
+version is the current one.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.http import HttpResponse
+
+
+STATS_KEY = 'response-cache:stats:{}'
+STATS = ('hit', 'stale', 'miss')
+
+
+def count(name):
+    """Count a lookup of the response cache."""
+    key = STATS_KEY.format(name)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def stats():
+    """Return the lookup counts of the response cache."""
+    return {name: cache.get(STATS_KEY.format(name), 0) for name in STATS}
+
+
+def entry_key(user_id, view, action, params, media_type):
+    """Return the cache key of a response."""
+    digest = hashlib.sha1(
+        f'{params}:{media_type}'.encode()
+    ).hexdigest()
+
+    return f'response-cache:{user_id}:{view}:{action}:{digest}'
+
+
+def lock_key(key):
+    """Return the key held while a response is regenerated."""
+    return f'{key}:lock'
+
+
+def acquire_lock(key, timeout):
+    """Return whether this request gets to regenerate an entry."""
+    return cache.add(lock_key(key), 1, timeout=timeout)
+
+
+def release_lock(key):
+    """Let another request regenerate an entry."""
+    cache.delete(lock_key(key))
+
+
+def get_entry(key):
+    """Return the cached entry, if any."""
+    return cache.get(key)
+
+
+def set_entry(key, version, response, timeout):
+    """Cache a rendered response at a version."""
+    cache.set(key, {
+        'version': version,
+        'time': time.time(),
+        'content': response.content,
+        'content_type': response['Content-Type'],
+    }, timeout=timeout)
+    release_lock(key)
+
+
+def entry_response(entry, state):
+    """Return a response with the content of an entry."""
+    response = HttpResponse(
+        entry['content'], content_type=entry['content_type'],
+    )
+    response['X-Cache'] = state
+    response['Age'] = int(max(time.time() - entry['time'], 0))
+
+    return response
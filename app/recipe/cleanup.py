@@ -0,0 +1,170 @@
+"""
+Garbage collection of recipe image files no recipe references.
+
+Image blobs count the recipes using them, so collection starts from the
+blobs left without references for the grace period: their files and the
+variants no other blob uses are deleted along with them. The upload
+directory is then walked with os.scandir for files no blob knows of,
+such as uploads whose recipe was never committed, checked in batches
+against the blob names and variants, both served by indexes.
+
+Files are only deleted once untouched for the grace period. Saving
+content that already exists and reusing variants touch their files, so
+a new reference restarts the period.
+"""
+from collections import Counter
+from datetime import datetime, timezone
+from itertools import islice
+import os
+import time
+
+from core.models import ImageBlob, image_variant_names
+from core.storage import content_storage
+
+
+UPLOAD_DIR = os.path.join('uploads', 'recipe')
+BATCH_SIZE = 1000
+
+
+def walk_files(path):
+    """Yield the directory entries of the files below a directory."""
+    directories = [path]
+    while directories:
+        try:
+            entries = os.scandir(directories.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+
+def variant_names(variants):
+    """Return the file names of the variants of a blob."""
+    return [name for files in variants.values() for name in files.values()]
+
+
+def used_variants(names, exclude=()):
+    """Return the variant names of the blobs, but exclude, using names."""
+    blobs = ImageBlob.objects.annotate(
+        variant_names=image_variant_names('variants'),
+    ).filter(
+        variant_names__has_any_keys=names,
+    ).exclude(
+        name__in=exclude,
+    ).values_list('variant_names', flat=True)
+    used = set()
+    for blob_variant_names in blobs:
+        used.update(blob_variant_names)
+
+    return used
+
+
+def referenced_names(names):
+    """Return the names blobs use as their image or as a variant."""
+    referenced = set(ImageBlob.objects.filter(
+        name__in=names,
+    ).values_list('name', flat=True))
+
+    return referenced | used_variants(names)
+
+
+def delete_file(path, deadline, dry_run=False):
+    """Delete a file unless it was touched since the deadline.
+
+    Returns the size of the deleted file, 0 if it was already gone, or
+    None if it was kept. With dry_run the file is only checked.
+    """
+    try:
+        stat = os.stat(path)
+        if stat.st_mtime >= deadline:
+            return None
+        if not dry_run:
+            os.unlink(path)
+    except FileNotFoundError:
+        return 0
+
+    return stat.st_size
+
+
+def collect_unused_blobs(stats, deadline, dry_run, batch_size):
+    """Delete the files of blobs without references since the deadline.
+
+    A blob whose file was touched meanwhile is kept, as are variants
+    other blobs use. Rows are only deleted while still unreferenced.
+    """
+    unused = ImageBlob.objects.filter(
+        ref_count=0,
+        updated_at__lt=datetime.fromtimestamp(deadline, timezone.utc),
+    ).order_by('name').values_list('name', 'variants')
+    after = ''
+    while True:
+        batch = list(unused.filter(name__gt=after)[:batch_size])
+        if not batch:
+            break
+        after = batch[-1][0]
+
+        deleted = {}
+        for name, variants in batch:
+            size = delete_file(content_storage.path(name), deadline, dry_run)
+            if size is not None:
+                deleted[name] = variant_names(variants)
+                stats['orphans'] += 1
+                stats['freed'] += size
+        names = [name for variants in deleted.values() for name in variants]
+        if names:
+            used = used_variants(names, exclude=list(deleted))
+            for name in set(names) - used:
+                path = content_storage.path(name)
+                size = delete_file(path, deadline, dry_run)
+                if size is not None:
+                    stats['orphans'] += 1
+                    stats['freed'] += size
+        if deleted and not dry_run:
+            ImageBlob.objects.filter(name__in=deleted, ref_count=0).delete()
+
+
+def collect_unknown_files(stats, deadline, dry_run, batch_size):
+    """Delete files no blob uses that were untouched since the deadline."""
+    root = content_storage.location
+    files = walk_files(os.path.join(root, UPLOAD_DIR))
+    while True:
+        batch = list(islice(files, batch_size))
+        if not batch:
+            break
+        candidates = {}
+        for entry in batch:
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            stats['files'] += 1
+            stats['bytes'] += stat.st_size
+            if stat.st_mtime < deadline:
+                name = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                candidates[name] = entry.path
+        if not candidates:
+            continue
+
+        for name in candidates.keys() - referenced_names(list(candidates)):
+            size = delete_file(candidates[name], deadline, dry_run)
+            if size is not None:
+                stats['orphans'] += 1
+                stats['freed'] += size
+
+
+def collect_orphans(grace, dry_run=False, batch_size=BATCH_SIZE):
+    """Delete image files unreferenced and untouched for grace seconds.
+
+    Returns counts of the files and bytes scanned and of the orphans
+    found and the bytes they held. With dry_run nothing is deleted.
+    """
+    stats = Counter()
+    deadline = time.time() - grace
+    collect_unused_blobs(stats, deadline, dry_run, batch_size)
+    collect_unknown_files(stats, deadline, dry_run, batch_size)
+
+    return stats
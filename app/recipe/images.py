@@ -0,0 +1,230 @@
+"""
+Background processing of uploaded recipe images into resized variants.
+
+Uploads are marked as processing and handed to a thread pool of
+IMAGE_PROCESSING_THREADS once committed. Jobs live in the recipe rows
+themselves, so the process_images command picks up any that a restart
+dropped, and runs them all when the thread pool is disabled.
+
+Variants are content addressed like the images themselves and kept on
+the image blob, so uploads of an image already processed reuse them,
+touching their files or rendering any that are gone.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import io
+import logging
+import os
+import threading
+
+from PIL import Image, ImageOps, features
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+
+from core.models import (
+    CollectionVersion,
+    ImageBlob,
+    Recipe,
+    new_version,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Largest first, so each variant is resized from the previous one.
+VARIANTS = (
+    ('full', 1600),
+    ('card', 600),
+    ('thumbnail', 150),
+)
+FORMATS = (
+    ('webp', '.webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', '.jpg', 'JPEG', {
+        'quality': 85, 'progressive': True, 'optimize': True,
+    }),
+)
+
+
+def output_formats():
+    """Return the formats to encode variants in.
+
+    WebP is skipped when Pillow was built without it, which raises
+    KeyError on encoding rather than an OSError.
+    """
+    if features.check('webp'):
+        return FORMATS
+
+    return tuple(fmt for fmt in FORMATS if fmt[0] != 'webp')
+
+
+def variant_name(variant, ext):
+    """Return the name a variant is saved as, before its content names it."""
+    return os.path.join('uploads', 'recipe', 'variants', f'{variant}{ext}')
+
+
+def flatten(img):
+    """Return an RGB copy of an image, with transparency over white."""
+    if img.mode == 'RGB':
+        return img
+    background = Image.new('RGB', img.size, 'white')
+    background.paste(img, mask=img.getchannel('A'))
+
+    return background
+
+
+def encode(img, fmt, options):
+    """Return an image encoded in a format."""
+    buffer = io.BytesIO()
+    if fmt == 'JPEG':
+        img = flatten(img)
+    img.save(buffer, format=fmt, **options)
+
+    return buffer.getvalue()
+
+
+def render_variants(file):
+    """Return the encoded variants of an image file by variant and format."""
+    with Image.open(file) as img:
+        # JPEGs are decoded at the smallest scale still covering the
+        # largest variant, which skips most of the work for big photos.
+        img.draft('RGB', (VARIANTS[0][1], VARIANTS[0][1]))
+        img = ImageOps.exif_transpose(img)
+    has_alpha = 'A' in img.getbands() or 'transparency' in img.info
+    img = img.convert('RGBA' if has_alpha else 'RGB')
+
+    formats = output_formats()
+    rendered = {}
+    for variant, size in VARIANTS:
+        img.thumbnail((size, size), Image.LANCZOS)
+        rendered[variant] = {
+            name: (ext, encode(img, fmt, options))
+            for name, ext, fmt, options in formats
+        }
+
+    return rendered
+
+
+def process_recipe_image(recipe_id):
+    """Create the variants of a recipe image waiting to be processed.
+
+    Returns the status the recipe was left in, or None if it had no job.
+    """
+    recipe = Recipe.objects.filter(
+        id=recipe_id, image_status=Recipe.IMAGE_PROCESSING,
+    ).only('id', 'user_id', 'image').first()
+    if recipe is None:
+        return None
+
+    image_name = recipe.image.name
+    storage = recipe.image.storage
+    variants = ImageBlob.objects.filter(name=image_name).values_list(
+        'variants', flat=True,
+    ).first() or {}
+    if not all(
+        storage.touch(name)
+        for files in variants.values()
+        for name in files.values()
+    ):
+        # Variants the garbage collector removed are rendered again.
+        variants = {}
+    image_status = Recipe.IMAGE_READY
+    if not variants:
+        try:
+            with recipe.image.open('rb') as file:
+                rendered = render_variants(file)
+            for variant, files in rendered.items():
+                variants[variant] = {
+                    name: storage.save(
+                        variant_name(variant, ext), ContentFile(data),
+                    )
+                    for name, (ext, data) in files.items()
+                }
+        except Exception:
+            # Any error, such as a codec missing from Pillow, fails the
+            # job rather than leaving it to be retried forever.
+            logger.exception(
+                'Could not process image of recipe %s', recipe_id,
+            )
+            image_status = Recipe.IMAGE_FAILED
+            variants = {}
+        else:
+            ImageBlob.objects.filter(name=image_name).update(
+                variants=variants,
+            )
+
+    with transaction.atomic():
+        # Images replaced meanwhile are left to their own job.
+        updated = Recipe.objects.filter(
+            id=recipe_id,
+            image=image_name,
+            image_status=Recipe.IMAGE_PROCESSING,
+        ).update(
+            image_status=image_status,
+            image_variants=variants,
+            version=new_version(),
+        )
+        if updated:
+            CollectionVersion.objects.bump(recipe.user_id)
+
+    return image_status if updated else None
+
+
+def process_pending(limit=None):
+    """Process images waiting for a job and return how many were run."""
+    recipe_ids = Recipe.objects.filter(
+        image_status=Recipe.IMAGE_PROCESSING,
+    ).order_by('id').values_list('id', flat=True)
+    if limit:
+        recipe_ids = recipe_ids[:limit]
+
+    processed = 0
+    for recipe_id in list(recipe_ids):
+        try:
+            image_status = process_recipe_image(recipe_id)
+        except Exception:
+            logger.exception('Image job for recipe %s failed', recipe_id)
+            continue
+        if image_status is not None:
+            processed += 1
+
+    return processed
+
+
+def run_job(recipe_id):
+    """Process a recipe image from a pool thread."""
+    try:
+        process_recipe_image(recipe_id)
+    except Exception:
+        logger.exception('Image job for recipe %s failed', recipe_id)
+    finally:
+        connection.close()
+
+
+class ImageJobRunner:
+    """Run image jobs on a pool of threads started on first use."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def submit(self, recipe_id):
+        """Run the job of a recipe, unless the thread pool is disabled."""
+        threads = settings.IMAGE_PROCESSING_THREADS
+        if not threads:
+            return
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=threads,
+                    thread_name_prefix='recipe-images',
+                )
+        self.executor.submit(run_job, recipe_id)
+
+
+runner = ImageJobRunner()
+
+
+def enqueue(recipe):
+    """Process the image of a recipe once the upload is committed."""
+    transaction.on_commit(lambda: runner.submit(recipe.id))
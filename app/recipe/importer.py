@@ -0,0 +1,258 @@
+"""
+Bulk import of recipes with Postgres COPY.
+"""
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+import csv
+import io
+import json
+import time
+
+from django.db import DatabaseError, connection, transaction
+
+from core.models import (
+    CollectionVersion,
+    Recipe,
+    RecipeImport,
+    Tag,
+    Ingredient,
+    new_version,
+)
+
+
+BATCH_SIZE = 5000
+LIST_SEPARATOR = '|'
+MAX_PRICE = Decimal('999.99')
+
+RESERVE_IDS_SQL = (
+    "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+    'FROM generate_series(1, %s)'
+)
+STAGE_RECIPES_SQL = (
+    'CREATE TEMPORARY TABLE import_recipe ('
+    'id bigint, title text, description text, time_minutes integer, '
+    'price numeric(5, 2), link text) ON COMMIT DROP'
+)
+INSERT_RECIPES_SQL = (
+    'INSERT INTO {table} '
+    '(id, user_id, title, description, time_minutes, price, link, version, '
+    'image_status, image_variants) '
+    'SELECT id, %s, title, description, time_minutes, price, link, %s, '
+    "'', '{{}}' FROM import_recipe"
+)
+STAGE_LINKS_SQL = (
+    'CREATE TEMPORARY TABLE import_link (recipe_id bigint, target_id bigint) '
+    'ON COMMIT DROP'
+)
+INSERT_LINKS_SQL = (
+    'INSERT INTO {table} (recipe_id, {column}) '
+    'SELECT recipe_id, target_id FROM import_link '
+    'ON CONFLICT DO NOTHING'
+)
+
+
+class RecipeImportError(Exception):
+    """Raised when an import row cannot be loaded."""
+
+
+def read_csv(lines):
+    """Yield rows from CSV lines with a header.
+
+    Tags and ingredients are names separated by `|`.
+    """
+    for row in csv.DictReader(lines):
+        for key in ('tags', 'ingredients'):
+            value = row.get(key) or ''
+            row[key] = [
+                name for name in value.split(LIST_SEPARATOR) if name.strip()
+            ]
+        yield row
+
+
+def read_jsonl(lines):
+    """Yield rows from lines holding one JSON object each."""
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+
+def clean_names(value):
+    """Return a list of names from a list of strings or {'name'} dicts."""
+    names = []
+    for item in value or []:
+        if isinstance(item, dict):
+            item = item.get('name')
+        if not isinstance(item, str) or not 0 < len(item.strip()) <= 255:
+            raise ValueError(f'invalid name {item!r}')
+        names.append(item.strip())
+
+    return names
+
+
+def clean_row(row):
+    """Validate a row and return it with normalized values."""
+    if not isinstance(row, dict):
+        raise ValueError('expected an object')
+    title = str(row.get('title') or '').strip()
+    if not 0 < len(title) <= 255:
+        raise ValueError('title must be 1 to 255 characters')
+    link = str(row.get('link') or '')
+    if len(link) > 255:
+        raise ValueError('link must be at most 255 characters')
+    try:
+        time_minutes = int(row.get('time_minutes'))
+        price = Decimal(str(row.get('price'))).quantize(Decimal('0.01'))
+        if not price.is_finite():
+            raise ValueError('not finite')
+    except (TypeError, ValueError, InvalidOperation):
+        raise ValueError('time_minutes and price must be numbers')
+    if not -MAX_PRICE <= price <= MAX_PRICE:
+        raise ValueError(f'price must be at most {MAX_PRICE}')
+
+    return {
+        'title': title,
+        'description': str(row.get('description') or ''),
+        'time_minutes': time_minutes,
+        'price': price,
+        'link': link,
+        'tags': clean_names(row.get('tags')),
+        'ingredients': clean_names(row.get('ingredients')),
+    }
+
+
+def copy_rows(cursor, table, columns, rows):
+    """Load rows into a table with COPY.
+
+    Every field is quoted, and quoted fields are never read as NULL, so
+    values such as an empty string or \\N load as they are.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(
+        f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)',
+        buffer,
+    )
+
+
+class RecipeImporter:
+    """Load recipes for a RecipeImport in batches.
+
+    Each batch is copied into staging tables and inserted with set-based
+    statements in its own transaction, together with the progress of the
+    import and a bump of the user's collection version. A failed import
+    resumes after the last committed batch.
+    """
+
+    def __init__(self, recipe_import, batch_size=None):
+        self.recipe_import = recipe_import
+        self.batch_size = batch_size or BATCH_SIZE
+        self.rows_per_sec = 0.0
+
+    def run(self, rows, on_batch=None):
+        """Import the rows not yet loaded and return the import."""
+        recipe_import = self.recipe_import
+        rows = islice(rows, recipe_import.rows_done, None)
+        loaded = 0
+        start = time.perf_counter()
+        try:
+            while True:
+                batch = []
+                for row in islice(rows, self.batch_size):
+                    line = recipe_import.rows_done + len(batch) + 1
+                    try:
+                        batch.append(clean_row(row))
+                    except ValueError as exc:
+                        raise RecipeImportError(f'Row {line}: {exc}.')
+                if not batch:
+                    break
+                self.load(batch)
+                loaded += len(batch)
+                self.rows_per_sec = loaded / (time.perf_counter() - start)
+                if on_batch:
+                    on_batch(self)
+        except (
+            RecipeImportError, ValueError, csv.Error, DatabaseError,
+        ) as exc:
+            recipe_import.status = RecipeImport.STATUS_FAILED
+            recipe_import.error = str(exc)
+            recipe_import.save(update_fields=['status', 'error'])
+            raise RecipeImportError(str(exc))
+
+        recipe_import.status = RecipeImport.STATUS_DONE
+        recipe_import.error = ''
+        recipe_import.save(update_fields=['status', 'error'])
+
+        return recipe_import
+
+    @transaction.atomic
+    def load(self, batch):
+        """Insert a batch of clean rows and record the progress."""
+        recipe_import = self.recipe_import
+        user = recipe_import.user
+        with connection.cursor() as cursor:
+            cursor.execute(
+                RESERVE_IDS_SQL,
+                [Recipe._meta.db_table, len(batch)],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute(STAGE_RECIPES_SQL)
+            copy_rows(
+                cursor,
+                'import_recipe',
+                [
+                    'id', 'title', 'description', 'time_minutes', 'price',
+                    'link',
+                ],
+                [
+                    [
+                        recipe_id, row['title'], row['description'],
+                        row['time_minutes'], row['price'], row['link'],
+                    ]
+                    for recipe_id, row in zip(ids, batch)
+                ],
+            )
+            cursor.execute(
+                INSERT_RECIPES_SQL.format(
+                    table=connection.ops.quote_name(Recipe._meta.db_table),
+                ),
+                [user.pk, new_version()],
+            )
+            cursor.execute('DROP TABLE import_recipe')
+
+            for name, model in (('tags', Tag), ('ingredients', Ingredient)):
+                name_map = model.objects.resolve_name_map(
+                    user,
+                    [target for row in batch for target in row[name]],
+                )
+                links = {
+                    (recipe_id, name_map[target].id)
+                    for recipe_id, row in zip(ids, batch)
+                    for target in row[name]
+                }
+                self.load_links(cursor, getattr(Recipe, name), links)
+        CollectionVersion.objects.bump(user.pk)
+
+        recipe_import.rows_done += len(batch)
+        recipe_import.status = RecipeImport.STATUS_RUNNING
+        recipe_import.save(update_fields=['rows_done', 'status'])
+
+    def load_links(self, cursor, related, links):
+        """Insert (recipe_id, target_id) pairs into an m2m table."""
+        if not links:
+            return
+        cursor.execute(STAGE_LINKS_SQL)
+        copy_rows(
+            cursor, 'import_link', ['recipe_id', 'target_id'], sorted(links),
+        )
+        cursor.execute(INSERT_LINKS_SQL.format(
+            table=connection.ops.quote_name(related.through._meta.db_table),
+            column=related.field.m2m_reverse_name(),
+        ))
+        cursor.execute('DROP TABLE import_link')
@@ -0,0 +1,163 @@
+"""
+Serving of recipe images once their owner is checked.
+
+With MEDIA_SENDFILE_HEADER set, responses carry no body and hand the
+transfer to the front proxy: X-Accel-Redirect points nginx at the file
+under the internal MEDIA_ACCEL_PREFIX location, X-Sendfile gives Apache
+or lighttpd its path. Otherwise files are served from Python, answering
+If-Modified-Since and single byte ranges. Whole files go out through
+FileResponse, which WSGI servers send with sendfile().
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from rest_framework import status
+
+from core.storage import content_storage
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CONTENT_NAME_RE = re.compile(r'/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$')
+# Files are only served to their owners, so shared caches keep out.
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'private, no-cache'
+
+# Python before 3.11 does not know WebP, which image variants use.
+mimetypes.add_type('image/webp', '.webp')
+
+
+def cache_control(name):
+    """Return the Cache-Control of a file.
+
+    Content addressed names never change content, so browsers keep them
+    for a year without asking again.
+    """
+    if CONTENT_NAME_RE.search(name):
+        return IMMUTABLE_CACHE_CONTROL
+
+    return REVALIDATE_CACHE_CONTROL
+
+
+def parse_range(header, size):
+    """Return the first and last byte of a Range header within size.
+
+    Returns None for headers that are missing, invalid or not a single
+    byte range, such as one ending before it starts, which are answered
+    with the whole file as RFC 7233 allows. Raises ValueError for ranges
+    starting past the end of the file.
+    """
+    match = RANGE_RE.match(header or '')
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # A suffix range of the last bytes.
+        first, last = max(size - int(last), 0), size - 1
+    else:
+        first = int(first)
+        if last and int(last) < first:
+            return None
+        last = min(int(last), size - 1) if last else size - 1
+    if first >= size:
+        raise ValueError(f'Range {header} is not satisfiable.')
+
+    return first, last
+
+
+def read_range(file, first, last, chunk_size=FileResponse.block_size):
+    """Yield the bytes of a file from first to last, and close it."""
+    with file:
+        file.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            chunk = file.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def sendfile_response(name, path):
+    """Return a response handing the transfer of a file to the proxy."""
+    response = HttpResponse()
+    header = settings.MEDIA_SENDFILE_HEADER
+    if header.lower() == 'x-accel-redirect':
+        response[header] = quote(settings.MEDIA_ACCEL_PREFIX + name)
+    else:
+        response[header] = path
+
+    return response
+
+
+def file_response(request, path):
+    """Return a response serving a file from Python."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404('No such file.')
+    if not was_modified_since(
+        request.META.get('HTTP_IF_MODIFIED_SINCE'),
+        stat.st_mtime,
+        stat.st_size,
+    ):
+        return HttpResponseNotModified()
+
+    last_modified = http_date(stat.st_mtime)
+    byte_range = None
+    if request.META.get('HTTP_IF_RANGE', last_modified) == last_modified:
+        try:
+            byte_range = parse_range(
+                request.META.get('HTTP_RANGE'), stat.st_size,
+            )
+        except ValueError:
+            response = HttpResponse(
+                status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            )
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+    file = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file)
+    else:
+        first, last = byte_range
+        response = StreamingHttpResponse(
+            read_range(file, first, last),
+            status=status.HTTP_206_PARTIAL_CONTENT,
+        )
+        response['Content-Length'] = last - first + 1
+        response['Content-Range'] = f'bytes {first}-{last}/{stat.st_size}'
+    response['Last-Modified'] = last_modified
+    response['Accept-Ranges'] = 'bytes'
+
+    return response
+
+
+def serve(request, name):
+    """Return a response serving a stored file by name."""
+    path = content_storage.path(name)
+    if settings.MEDIA_SENDFILE_HEADER:
+        response = sendfile_response(name, path)
+    else:
+        response = file_response(request, path)
+    if response.status_code in (
+        status.HTTP_200_OK, status.HTTP_206_PARTIAL_CONTENT,
+    ):
+        content_type = mimetypes.guess_type(name)[0]
+        response['Content-Type'] = content_type or 'application/octet-stream'
+    response['Cache-Control'] = cache_control(name)
+
+    return response
@@ -0,0 +1,191 @@
+"""
+Pagination for the recipe APIs.
+"""
+from base64 import b64decode, b64encode
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Forward-only keyset pagination over a fixed ordering.
+
+    The cursor holds the ordering values of the last row on the page, so
+    each page is a range scan starting after that row and no COUNT(*) is
+    ever issued. The last ordering field must be unique.
+    """
+    ordering = ('-id',)
+    page_size = 100
+    max_page_size = 1000
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return a single page of results."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+
+        return self.page
+
+    def get_page_size(self, request):
+        """Return the page size requested by the client, if valid."""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+
+        return min(page_size, self.max_page_size)
+
+    def get_position_filter(self, position):
+        """Return a filter selecting rows after the given position.
+
+        The leading field is bounded on its own so the database can use
+        it as an index range; the remaining fields break ties.
+        """
+        fields = [field.lstrip('-') for field in self.ordering]
+        lookups = [
+            'lt' if field.startswith('-') else 'gt'
+            for field in self.ordering
+        ]
+
+        after = Q()
+        for i in range(len(fields)):
+            term = Q(**{f'{fields[i]}__{lookups[i]}': position[i]})
+            for j in range(i):
+                term &= Q(**{fields[j]: position[j]})
+            after |= term
+        if len(fields) == 1:
+            return after
+
+        bound = Q(**{f'{fields[0]}__{lookups[0]}e': position[0]})
+        return bound & after
+
+    def get_position(self, row):
+        """Return the ordering values of a row."""
+        fields = [field.lstrip('-') for field in self.ordering]
+        if isinstance(row, dict):
+            return [row[field] for field in fields]
+
+        return [getattr(row, field) for field in fields]
+
+    def decode_cursor(self, request, model):
+        """Return the position encoded in the request cursor, if any.
+
+        Each value is converted by its ordering field, so malformed
+        cursors are rejected here rather than failing in the query.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            position = json.loads(b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or \
+                len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        fields = [
+            model._meta.get_field(field.lstrip('-'))
+            for field in self.ordering
+        ]
+        try:
+            position = [
+                field.to_python(value)
+                for field, value in zip(fields, position)
+            ]
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+        for value in position:
+            if value is None or isinstance(value, str) and '\x00' in value:
+                raise NotFound(self.invalid_cursor_message)
+
+        return position
+
+    def encode_cursor(self, position):
+        """Return a url for the page after the given position."""
+        encoded = b64encode(json.dumps(position).encode('utf-8'))
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            encoded.decode('ascii'),
+        )
+
+    def get_next_link(self):
+        """Return the url of the next page, if there is one."""
+        if not self.has_next:
+            return None
+
+        return self.encode_cursor(self.get_position(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        """Return the page wrapped with the next link."""
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        """Return the schema of a paginated response."""
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                },
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        """Return the query parameters used for pagination."""
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+
+class RecipePagination(KeysetPagination):
+    """Pagination for recipes, newest first."""
+    ordering = ('-id',)
+
+
+class RecipeAttrPagination(KeysetPagination):
+    """Pagination for tags and ingredients, by name descending."""
+    ordering = ('-name', '-id')
@@ -0,0 +1,71 @@
+"""
+Query planning for the recipe APIs.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+
+from rest_framework import serializers
+
+
+READ_ACTIONS = ('list', 'retrieve')
+
+
+def plan_prefetches(serializer):
+    """Return the prefetches needed to render nested serializer fields."""
+    prefetches = []
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if not isinstance(field, serializers.ListSerializer):
+            continue
+        child = field.child
+        if not isinstance(child, serializers.ModelSerializer):
+            continue
+        model = child.Meta.model
+        columns = [
+            name for name, child_field in child.fields.items()
+            if not child_field.write_only
+        ]
+        prefetches.append(Prefetch(
+            field.source,
+            queryset=model.objects.only(*columns).order_by('id'),
+        ))
+
+    return prefetches
+
+
+def plan_columns(serializer):
+    """Return the model columns needed to render the serializer fields.
+
+    Returns None if a field reads anything but a model field, in which
+    case every column is loaded.
+    """
+    opts = serializer.Meta.model._meta
+    columns = [opts.pk.name]
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        try:
+            model_field = opts.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if model_field.many_to_many:
+            continue
+        if not model_field.concrete:
+            return None
+        columns.append(model_field.name)
+
+    return columns
+
+
+def plan_queryset(queryset, action, serializer):
+    """Apply the prefetches and columns a read action needs."""
+    if action not in READ_ACTIONS:
+        return queryset
+
+    queryset = queryset.prefetch_related(*plan_prefetches(serializer))
+    columns = plan_columns(serializer)
+    if columns is not None:
+        queryset = queryset.only(*columns)
+
+    return queryset
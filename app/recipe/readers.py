@@ -0,0 +1,310 @@
+"""
+Read paths rendering recipe lists straight from database rows.
+"""
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.db.models.fields.related_descriptors import (
+    ManyToManyDescriptor,
+)
+
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+
+PLAIN_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.IntegerField,
+)
+
+
+def plain_value(value):
+    """Return a column value that needs no conversion."""
+    return value
+
+
+def decimal_places(field):
+    """Return the places of a decimal field rendered as a plain string."""
+    coerce_to_string = getattr(
+        field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING,
+    )
+    if not coerce_to_string or field.localize:
+        return None
+
+    return field.decimal_places
+
+
+def column_converter(field):
+    """Return a function rendering a column value for the field.
+
+    Returns None if the field cannot be rendered from a column value.
+    """
+    if type(field) in PLAIN_FIELDS:
+        return plain_value
+    if not isinstance(field, serializers.DecimalField):
+        return None
+
+    places = decimal_places(field)
+    exponent = None if places is None else -places
+
+    def decimal_value(value):
+        # Values already at the field's scale render the same as
+        # DecimalField.to_representation does after its quantize.
+        if value.as_tuple().exponent == exponent:
+            return f'{value:f}'
+        return field.to_representation(value)
+
+    return decimal_value
+
+
+def column_sql(field, model_field, alias):
+    """Return SQL rendering a column as the field's JSON value.
+
+    Returns None if Postgres cannot render the value the same way.
+    """
+    column = f'{alias}.{connection.ops.quote_name(model_field.column)}'
+    if type(field) in PLAIN_FIELDS:
+        return column
+    if isinstance(field, serializers.DecimalField) and \
+            decimal_places(field) == model_field.decimal_places:
+        return f'{column}::text'
+
+    return None
+
+
+def plan_columns(model, fields):
+    """Return (name, field, model field) for each readable field.
+
+    Returns None if any field is not a plain column of the model.
+    """
+    columns = []
+    for name, field in fields.items():
+        if field.write_only:
+            continue
+        if column_converter(field) is None or '.' in field.source:
+            return None
+        model_field = model._meta.get_field(field.source)
+        if not model_field.concrete or model_field.is_relation:
+            return None
+        columns.append((name, field, model_field))
+
+    return columns
+
+
+def plan_fields(serializer):
+    """Return the readable fields of a serializer planned for rows.
+
+    Returns a list of (name, columns, descriptor), where columns are the
+    planned columns of a many to many relation or a single planned column
+    when descriptor is None. Returns None if any field cannot be read.
+    """
+    model = serializer.Meta.model
+    planned = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if not isinstance(field, serializers.ListSerializer):
+            columns = plan_columns(model, {name: field})
+            if columns is None:
+                return None
+            planned.append((name, columns[0], None))
+            continue
+        child = field.child
+        descriptor = getattr(model, field.source, None)
+        if not isinstance(child, serializers.ModelSerializer) or \
+                not isinstance(descriptor, ManyToManyDescriptor) or \
+                descriptor.reverse:
+            return None
+        columns = plan_columns(child.Meta.model, child.fields)
+        if columns is None:
+            return None
+        planned.append((name, columns, descriptor))
+
+    return planned
+
+
+class RelatedReader:
+    """Read the rows of a many to many relation grouped by owner."""
+
+    def __init__(self, name, columns, descriptor):
+        self.name = name
+        self.through = descriptor.through
+        self.owner = descriptor.field.m2m_field_name()
+        self.target = descriptor.field.m2m_reverse_field_name()
+        self.columns = [
+            (name, model_field.attname, column_converter(field))
+            for name, field, model_field in columns
+        ]
+
+    def fetch(self, ids):
+        """Return the rendered related rows by owner ID."""
+        rows = self.through.objects.filter(**{
+            f'{self.owner}_id__any': ids,
+        }).order_by(f'{self.target}_id').values_list(
+            f'{self.owner}_id',
+            *[
+                f'{self.target}__{column}'
+                for name, column, conv in self.columns
+            ],
+        )
+
+        grouped = {}
+        for owner_id, *values in rows:
+            grouped.setdefault(owner_id, []).append({
+                name: None if value is None else conv(value)
+                for (name, column, conv), value in zip(self.columns, values)
+            })
+
+        return grouped
+
+
+class ListReader:
+    """Render the list output of a serializer from values_list rows.
+
+    Rows are fetched as named tuples, many to many relations are fetched
+    once per page and grouped by owner, and every field is rendered by a
+    converter chosen up front rather than by the serializer.
+    """
+
+    def __init__(self, fields, related):
+        self.fields = fields
+        self.related = related
+
+    @classmethod
+    def for_serializer(cls, serializer):
+        """Return a reader for the serializer, or None if unsupported."""
+        planned = plan_fields(serializer)
+        if planned is None:
+            return None
+
+        fields = []
+        related = []
+        for name, columns, descriptor in planned:
+            if descriptor is not None:
+                related.append(RelatedReader(name, columns, descriptor))
+                fields.append((name, None, None))
+                continue
+            name, field, model_field = columns
+            fields.append(
+                (name, model_field.attname, column_converter(field))
+            )
+
+        return cls(fields, related)
+
+    def queryset(self, queryset, columns=()):
+        """Return the queryset yielding the rows to render.
+
+        Rows also hold `id` and the given columns, such as the ones the
+        paginator orders by.
+        """
+        columns = ['id', *columns] + [
+            column for name, column, conv in self.fields if column
+        ]
+
+        return queryset.values_list(*dict.fromkeys(columns), named=True)
+
+    def render(self, rows):
+        """Return the rendered list for the rows."""
+        if not rows:
+            return []
+        ids = [row.id for row in rows]
+        related = {reader.name: reader.fetch(ids) for reader in self.related}
+
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, conv in self.fields:
+                if column is None:
+                    item[name] = related[name].get(row.id, [])
+                    continue
+                value = getattr(row, column)
+                item[name] = None if value is None else conv(value)
+            data.append(item)
+
+        return data
+
+
+def build_object(values):
+    """Return (sql, params) of a json_build_object of (sql, params) values.
+
+    Returns None if any value has no SQL.
+    """
+    parts = []
+    params = []
+    for name, (sql, sql_params) in values.items():
+        if sql is None:
+            return None
+        parts.append(f'%s, {sql}')
+        params += [name, *sql_params]
+
+    return f'json_build_object({", ".join(parts)})', params
+
+
+class JSONReader:
+    """Render the list output of a serializer as JSON inside Postgres.
+
+    Each row is built with json_build_object, with a correlated json_agg
+    subquery per many to many relation, and its JSON text is joined into
+    the response without being parsed.
+    """
+    relation_sql = (
+        "(SELECT coalesce(json_agg({row} ORDER BY t.{pk}), '[]'::json) "
+        'FROM {through} l JOIN {target} t ON t.{pk} = l.{target_column} '
+        'WHERE l.{owner_column} = {owner}.{owner_pk})'
+    )
+
+    def __init__(self, sql, params):
+        self.sql = sql
+        self.params = params
+
+    @classmethod
+    def for_serializer(cls, serializer):
+        """Return a reader for the serializer, or None if unsupported."""
+        planned = plan_fields(serializer)
+        if planned is None:
+            return None
+
+        quote_name = connection.ops.quote_name
+        opts = serializer.Meta.model._meta
+        alias = quote_name(opts.db_table)
+        values = {}
+        for name, columns, descriptor in planned:
+            if descriptor is None:
+                name, field, model_field = columns
+                values[name] = (column_sql(field, model_field, alias), [])
+                continue
+            target = descriptor.field.related_model._meta
+            row = build_object({
+                name: (column_sql(field, model_field, 't'), [])
+                for name, field, model_field in columns
+            })
+            if row is None:
+                return None
+            values[name] = (cls.relation_sql.format(
+                row=row[0],
+                pk=quote_name(target.pk.column),
+                through=quote_name(descriptor.through._meta.db_table),
+                target=quote_name(target.db_table),
+                target_column=quote_name(descriptor.field.m2m_reverse_name()),
+                owner_column=quote_name(descriptor.field.m2m_column_name()),
+                owner=alias,
+                owner_pk=quote_name(opts.pk.column),
+            ), row[1])
+
+        built = build_object(values)
+        if built is None:
+            return None
+
+        return cls(f'{built[0]}::text', built[1])
+
+    def queryset(self, queryset, columns=()):
+        """Return the queryset yielding rows with their JSON text."""
+        columns = dict.fromkeys(['id', *columns])
+
+        return queryset.annotate(
+            row_json=RawSQL(self.sql, self.params),
+        ).values_list(*columns, 'row_json', named=True)
+
+    def render(self, rows):
+        """Return the JSON array text of the rows."""
+        return '[' + ','.join(row.row_json for row in rows) + ']'
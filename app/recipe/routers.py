@@ -0,0 +1,19 @@
+"""
+Routers for the recipe app.
+"""
+from copy import deepcopy
+
+from rest_framework.routers import DefaultRouter
+
+
+class BulkRouter(DefaultRouter):
+    """Router that also maps bulk actions onto the list URL.
+
+    PATCH and DELETE on the list URL route to `bulk_partial_update` and
+    `bulk_destroy` for viewsets that define them.
+    """
+    routes = deepcopy(DefaultRouter.routes)
+    routes[0].mapping.update({
+        'patch': 'bulk_partial_update',
+        'delete': 'bulk_destroy',
+    })
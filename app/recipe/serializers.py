@@ -1,12 +1,22 @@
 """
 Serializers for recipe APIs
 """
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.functional import cached_property
+
+from drf_spectacular.utils import extend_schema_field
+
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
 from core.models import (
+    CollectionVersion,
     Recipe,
+    RecipeImport,
     Tag,
     Ingredient,
+    new_version,
 )
 
 
@@ -28,7 +38,187 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+MAX_BULK_ITEMS = 500
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Serializer for creating and updating recipes in bulk.
+
+    Every item is validated before anything is written, and errors are
+    reported per item. Writes use bulk_create/bulk_update and batched
+    link inserts in a single transaction, which skip model signals and so
+    bump the versions themselves.
+    """
+
+    @cached_property
+    def instance_map(self):
+        """Return the recipes being updated by ID."""
+        return {recipe.id: recipe for recipe in self.instance or []}
+
+    def to_internal_value(self, data):
+        """Validate each item, rejecting oversized and repeated batches."""
+        if isinstance(data, list) and len(data) > MAX_BULK_ITEMS:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    f'No more than {MAX_BULK_ITEMS} items are allowed.'
+                ],
+            })
+        items = super().to_internal_value(data)
+        if self.instance is None:
+            return items
+
+        seen = set()
+        errors = []
+        for item in items:
+            if item['id'] in seen:
+                errors.append({'id': ['Duplicate ID.']})
+            else:
+                errors.append({})
+            seen.add(item['id'])
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        return items
+
+    def _set_links(self, recipes, name, items_per_recipe):
+        """Replace the links of each recipe that was given a list."""
+        targets = [
+            (recipe, items)
+            for recipe, items in zip(recipes, items_per_recipe)
+            if items is not None
+        ]
+        if not targets:
+            return
+
+        related = getattr(Recipe, name)
+        through = related.through
+        column = related.field.m2m_reverse_name()
+        name_map = related.field.related_model.objects.resolve_name_map(
+            self.context['request'].user,
+            [item['name'] for recipe, items in targets for item in items],
+        )
+        wanted = {
+            (recipe.id, name_map[item['name']].id)
+            for recipe, items in targets for item in items
+        }
+
+        stale = []
+        current = set()
+        if self.instance is not None:
+            links = through.objects.filter(
+                recipe_id__any=[recipe.id for recipe, items in targets],
+            ).values_list('id', 'recipe_id', column)
+            for link_id, recipe_id, target_id in links:
+                if (recipe_id, target_id) in wanted:
+                    current.add((recipe_id, target_id))
+                else:
+                    stale.append(link_id)
+        if stale:
+            through.objects.filter(id__any=stale).delete()
+        through.objects.bulk_create(
+            [
+                through(recipe_id=recipe_id, **{column: target_id})
+                for recipe_id, target_id in sorted(wanted - current)
+            ],
+            ignore_conflicts=True,
+        )
+
+    def _pop_links(self, validated_data):
+        """Remove tags and ingredients from the items and return them."""
+        tags = [item.pop('tags', None) for item in validated_data]
+        ingredients = [
+            item.pop('ingredients', None) for item in validated_data
+        ]
+
+        return tags, ingredients
+
+    @transaction.atomic
+    def create(self, validated_data):
+        """Create recipes and their links in bulk."""
+        tags, ingredients = self._pop_links(validated_data)
+        recipes = Recipe.objects.bulk_create(
+            [Recipe(**item) for item in validated_data]
+        )
+        self._set_links(recipes, 'tags', tags)
+        self._set_links(recipes, 'ingredients', ingredients)
+        CollectionVersion.objects.bump(self.context['request'].user.pk)
+
+        return recipes
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        """Partially update recipes and their links in bulk."""
+        tags, ingredients = self._pop_links(validated_data)
+        recipes = []
+        fields = {'version'}
+        for item in validated_data:
+            recipe = self.instance_map[item.pop('id')]
+            for attr, value in item.items():
+                setattr(recipe, attr, value)
+            recipe.version = new_version()
+            fields.update(item)
+            recipes.append(recipe)
+        Recipe.objects.bulk_update(recipes, sorted(fields))
+        self._set_links(recipes, 'tags', tags)
+        self._set_links(recipes, 'ingredients', ingredients)
+        CollectionVersion.objects.bump(self.context['request'].user.pk)
+
+        return recipes
+
+
+class SparseFieldsMixin:
+    """Serializer mixin limiting the fields to those requested.
+
+    Takes `fields` and `omit` keyword arguments listing field names to
+    keep and to drop.
+    """
+
+    def __init__(self, *args, fields=None, omit=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        names = set(self.fields)
+        unknown = (set(fields or ()) | set(omit or ())) - names
+        if unknown:
+            raise serializers.ValidationError({
+                'fields': f'Unknown fields: {", ".join(sorted(unknown))}.',
+            })
+        if fields is not None:
+            names &= set(fields)
+        names -= set(omit or ())
+        for name in list(self.fields):
+            if name not in names:
+                self.fields.pop(name)
+
+
+@extend_schema_field({
+    'type': 'object',
+    'additionalProperties': {
+        'type': 'object',
+        'additionalProperties': {'type': 'string', 'format': 'uri'},
+    },
+})
+class ImageVariantsField(serializers.Field):
+    """Read only field rendering stored image variants as URLs."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        """Return the URL of each variant by variant and format."""
+        request = self.context.get('request')
+        urls = {}
+        for variant, files in value.items():
+            urls[variant] = {}
+            for fmt, name in files.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls[variant][fmt] = url
+
+        return urls
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for recipes."""
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
@@ -40,27 +230,29 @@ class RecipeSerializer(serializers.ModelSerializer):
             'ingredients',
         ]
         read_only_fields = ['id']
+        list_serializer_class = RecipeListSerializer
+
+    def _resolve_names(self, model, items):
+        """Return objects for the given names, creating missing ones."""
+        auth_user = self.context['request'].user
+        return model.objects.resolve_names(
+            auth_user,
+            [item['name'] for item in items],
+        )
 
     def _get_or_create_tags(self, tags, recipe):
         """Handle getting or creating tags as needed."""
-        auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_obj)
+        tag_objs = self._resolve_names(Tag, tags)
+        if tag_objs:
+            recipe.tags.add(*tag_objs)
 
     def _get_or_create_ingredients(self, ingredients, recipe):
         """Handle getting or creating ingredients as needed."""
-        auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,
-            )
-            recipe.ingredients.add(ingredient_obj)
+        ingredient_objs = self._resolve_names(Ingredient, ingredients)
+        if ingredient_objs:
+            recipe.ingredients.add(*ingredient_objs)
 
+    @transaction.atomic
     def create(self, validated_data):
         """Create a recipe."""
         tags = validated_data.pop('tags', [])
@@ -71,16 +263,21 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Update recipe."""
+        """Update recipe.
+
+        Tags and ingredients are diffed against the current links, so only
+        the rows that changed are deleted or inserted.
+        """
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            instance.tags.set(self._resolve_names(Tag, tags))
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            instance.ingredients.set(
+                self._resolve_names(Ingredient, ingredients)
+            )
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -91,16 +288,78 @@ class RecipeSerializer(serializers.ModelSerializer):
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe detail view."""
+    image_variants = ImageVariantsField()
 
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description', 'image']
+        fields = RecipeSerializer.Meta.fields + [
+            'description', 'image', 'image_status', 'image_variants',
+        ]
+        read_only_fields = ['id', 'image_status']
+
+
+class RecipeBulkUpdateSerializer(RecipeDetailSerializer):
+    """Serializer for one item of a bulk recipe update."""
+    id = serializers.IntegerField()
+
+    def validate_id(self, value):
+        """Check the ID is one of the recipes being updated."""
+        if value not in self.parent.instance_map:
+            raise serializers.ValidationError('Not found.')
+
+        return value
+
+    def validate(self, attrs):
+        """Require the ID even though the update is partial."""
+        if 'id' not in attrs:
+            raise serializers.ValidationError(
+                {'id': 'This field is required.'}
+            )
+
+        return attrs
+
+
+class RecipeBulkDeleteSerializer(serializers.Serializer):
+    """Serializer for deleting recipes in bulk."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=MAX_BULK_ITEMS,
+    )
+
+    def validate_ids(self, value):
+        """Check every ID is one of the user's recipes."""
+        ids = list(dict.fromkeys(value))
+        found = set(Recipe.objects.filter(
+            user=self.context['request'].user,
+            id__any=ids,
+        ).values_list('id', flat=True))
+        errors = {
+            index: ['Not found.']
+            for index, recipe_id in enumerate(value)
+            if recipe_id not in found
+        }
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        return ids
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to recipes."""
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
-        fields = ['id', 'image']
-        read_only_fields = ['id']
-        extra_kwargs = {'image': {'required': 'True'}}
\ No newline at end of file
+        fields = ['id', 'image', 'image_status', 'image_variants']
+        read_only_fields = ['id', 'image_status']
+        extra_kwargs = {'image': {'required': 'True'}}
+
+
+class RecipeImportSerializer(serializers.ModelSerializer):
+    """Serializer for the progress of recipe imports."""
+    rows_per_sec = serializers.FloatField(read_only=True, default=0.0)
+
+    class Meta:
+        model = RecipeImport
+        fields = ['id', 'status', 'rows_done', 'error', 'rows_per_sec']
+        read_only_fields = fields
@@ -0,0 +1,171 @@
+"""
+Tests for serving recipe images.
+"""
+from decimal import Decimal
+from io import BytesIO
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.utils.http import http_date
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.storage import content_storage
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def create_image_file():
+    """Return a generated PNG image."""
+    image_file = BytesIO()
+    Image.new('RGB', (10, 10)).save(image_file, format='PNG')
+
+    return ContentFile(image_file.getvalue(), name='sample.png')
+
+
+class PublicMediaTests(TestCase):
+    """Test unauthenticated media requests."""
+
+    def test_auth_required(self):
+        """Test auth is required to fetch recipe images."""
+        res = APIClient().get('/static/media/uploads/recipe/sample.png')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateMediaTests(TestCase):
+    """Test serving recipe images to authenticated users."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        self.recipe.image.save('sample.png', create_image_file())
+        self.url = self.recipe.image.url
+        with self.recipe.image.open('rb') as image_file:
+            self.content = image_file.read()
+
+    def tearDown(self):
+        content_storage.delete(self.recipe.image.name)
+
+    def test_serve_image(self):
+        """Test serving a recipe image cached as immutable."""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), self.content)
+        self.assertEqual(res['Content-Type'], 'image/png')
+        self.assertEqual(res['Content-Length'], str(len(self.content)))
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', res['Cache-Control'])
+
+    def test_serve_variant(self):
+        """Test serving a variant referenced by a recipe."""
+        variant = content_storage.save(
+            'uploads/recipe/variants/card.png', create_image_file(),
+        )
+        Recipe.objects.filter(id=self.recipe.id).update(
+            image=None,
+            image_variants={'card': {'jpeg': variant}},
+        )
+
+        res = self.client.get(content_storage.url(variant))
+        content_storage.delete(variant)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_other_users_image_not_found(self):
+        """Test images of other users are not served."""
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'testpass123',
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_serve_range(self):
+        """Test serving a byte range of an image."""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=4-11')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(res.streaming_content), self.content[4:12])
+        self.assertEqual(
+            res['Content-Range'], f'bytes 4-11/{len(self.content)}',
+        )
+
+    def test_unsatisfiable_range(self):
+        """Test ranges past the end of an image are rejected."""
+        res = self.client.get(
+            self.url, HTTP_RANGE=f'bytes={len(self.content)}-',
+        )
+
+        self.assertEqual(
+            res.status_code,
+            status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+        )
+
+    def test_reversed_range_ignored(self):
+        """Test ranges ending before they start get the whole image."""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=11-4')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), self.content)
+
+    def test_not_modified(self):
+        """Test an unchanged image is answered with 304."""
+        res = self.client.get(self.url)
+
+        res = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=res['Last-Modified'],
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_modified_since(self):
+        """Test an image changed since the given date is served."""
+        res = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=http_date(0))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(
+        MEDIA_SENDFILE_HEADER='X-Accel-Redirect',
+        MEDIA_ACCEL_PREFIX='/internal-media/',
+    )
+    def test_accel_redirect(self):
+        """Test transfers are handed to nginx with X-Accel-Redirect."""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content, b'')
+        self.assertEqual(
+            res['X-Accel-Redirect'],
+            f'/internal-media/{self.recipe.image.name}',
+        )
+        self.assertEqual(res['Content-Type'], 'image/png')
+
+    @override_settings(MEDIA_SENDFILE_HEADER='X-Sendfile')
+    def test_sendfile(self):
+        """Test transfers are handed to the proxy with X-Sendfile."""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res['X-Sendfile'], self.recipe.image.path)
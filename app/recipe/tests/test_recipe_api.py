@@ -1,25 +1,43 @@
 """
 Tests for recipe APIs.
 """
+from base64 import b64encode
 from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
+import hashlib
+import json
 import tempfile
+import tracemalloc
 import os
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import (
+    APIClient,
+    APIRequestFactory,
+    force_authenticate,
+)
 
 from core.models import (
+    ImageBlob,
     Recipe,
     Tag,
     Ingredient,
 )
 
+from recipe import cache
+from recipe.images import process_pending
+from recipe.views import RecipeViewSet
 from recipe.serializers import (
     RecipeSerializer,
     RecipeDetailSerializer,
@@ -27,6 +45,8 @@ from recipe.serializers import (
 
 
 RECIPES_URL = reverse('recipe:recipe-list')
+EXPORT_URL = reverse('recipe:recipe-export')
+IMPORT_URL = reverse('recipe:recipe-import-recipes')
 
 
 def detail_url(recipe_id):
@@ -90,7 +110,7 @@ class PrivateRecipeApiTests(TestCase):
         recipes = Recipe.objects.all().order_by('-id')
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_list_limited_to_user(self):
         """Test list of recipes is limited to authenticated user."""
@@ -103,7 +123,7 @@ class PrivateRecipeApiTests(TestCase):
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_get_recipe_detail(self):
         """Test get recipe detail."""
@@ -115,6 +135,474 @@ class PrivateRecipeApiTests(TestCase):
         serializer = RecipeDetailSerializer(recipe)
         self.assertEqual(res.data, serializer.data)
 
+    def test_list_recipes_query_count_constant(self):
+        """Test listing recipes uses a fixed number of queries."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        for _ in range(2):
+            recipe = create_recipe(user=self.user)
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+        with self.assertNumQueries(4):
+            self.client.get(RECIPES_URL)
+
+        for _ in range(10):
+            recipe = create_recipe(user=self.user)
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data['results']), 12)
+
+    def test_list_recipes_matches_serializer_json(self):
+        """Test the list renders the same bytes as RecipeSerializer."""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        quick = Tag.objects.create(user=self.user, name='Quick "fast"')
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        first = create_recipe(user=self.user, price=Decimal('5.5'), link='')
+        first.tags.add(quick, vegan)
+        first.ingredients.add(salt)
+        create_recipe(user=self.user, title='Caf\u00e9', price=Decimal('0'))
+
+        res = self.client.get(RECIPES_URL)
+
+        recipes = Recipe.objects.filter(user=self.user).order_by('-id')
+        serializer = RecipeSerializer(recipes, many=True)
+        expected = JSONRenderer().render({
+            'next': None,
+            'results': serializer.data,
+        })
+        self.assertEqual(res.content, expected)
+
+    def test_list_recipes_render_db_matches_serializer(self):
+        """Test lists rendered by the database match RecipeSerializer."""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        quick = Tag.objects.create(user=self.user, name='Quick "fast"')
+        salt = Ingredient.objects.create(user=self.user, name='Salt\n')
+        first = create_recipe(user=self.user, price=Decimal('5.5'), link='')
+        first.tags.add(quick, vegan)
+        first.ingredients.add(salt)
+        create_recipe(user=self.user, title='Caf\u00e9', price=Decimal('0'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, {'render': 'db'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(ctx), 2)
+        recipes = Recipe.objects.filter(user=self.user).order_by('-id')
+        serializer = RecipeSerializer(recipes, many=True)
+        expected = JSONRenderer().render({
+            'next': None,
+            'results': serializer.data,
+        })
+        self.assertEqual(json.loads(res.content), json.loads(expected))
+        self.assertEqual(
+            list(json.loads(res.content)['results'][0]),
+            list(serializer.data[0]),
+        )
+
+    def test_list_recipes_render_db_paginated(self):
+        """Test lists rendered by the database follow the next link."""
+        recipes = [create_recipe(user=self.user) for _ in range(3)]
+
+        res = self.client.get(
+            RECIPES_URL, {'render': 'db', 'page_size': 2, 'fields': 'id'},
+        )
+        data = json.loads(res.content)
+        self.assertEqual(
+            data['results'], [{'id': recipes[2].id}, {'id': recipes[1].id}],
+        )
+        data = json.loads(self.client.get(data['next']).content)
+
+        self.assertEqual(data, {'next': None, 'results': [
+            {'id': recipes[0].id},
+        ]})
+
+    def test_list_recipes_sparse_fields(self):
+        """Test listing only the requested fields skips unused queries."""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['results'], [{'id': recipe.id, 'title': recipe.title}],
+        )
+        self.assertEqual(len(ctx), 2)
+        self.assertNotIn('"price"', ctx[1]['sql'])
+
+    def test_list_recipes_defers_detail_columns(self):
+        """Test listing recipes does not load detail only columns."""
+        create_recipe(user=self.user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(RECIPES_URL)
+
+        self.assertNotIn('"description"', ctx[1]['sql'])
+        self.assertNotIn('"image"', ctx[1]['sql'])
+
+    def test_get_recipe_detail_omit_fields(self):
+        """Test omitting fields from a recipe detail."""
+        recipe = create_recipe(user=self.user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(
+                detail_url(recipe.id),
+                {
+                    'omit': 'description,image,image_status,image_variants,'
+                    'ingredients',
+                },
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(res.data),
+            {'id', 'title', 'time_minutes', 'price', 'link', 'tags'},
+        )
+        self.assertEqual(len(ctx), 3)
+        self.assertNotIn('"description"', ctx[1]['sql'])
+
+    def test_list_recipes_unknown_fields(self):
+        """Test requesting unknown fields returns an error."""
+        res = self.client.get(RECIPES_URL, {'fields': 'title,user'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_recipes_paginated(self):
+        """Test recipes are returned in pages following the next link."""
+        recipes = [create_recipe(user=self.user) for _ in range(5)]
+        expected = [recipe.id for recipe in reversed(recipes)]
+
+        ids = []
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            ids.extend(item['id'] for item in res.data['results'])
+            if res.data['next'] is None:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(ids, expected)
+
+    def test_list_recipes_paginated_with_filter(self):
+        """Test pagination applies after filtering by tags."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        tagged = []
+        for _ in range(3):
+            recipe = create_recipe(user=self.user)
+            recipe.tags.add(tag)
+            tagged.append(recipe.id)
+            create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL, {'tags': tag.id, 'page_size': 2})
+        page1 = [item['id'] for item in res.data['results']]
+        res = self.client.get(res.data['next'])
+        page2 = [item['id'] for item in res.data['results']]
+
+        self.assertEqual(page1 + page2, sorted(tagged, reverse=True))
+        self.assertIsNone(res.data['next'])
+
+    def test_list_recipes_pagination_no_count(self):
+        """Test paginating recipes never counts the collection."""
+        for _ in range(3):
+            create_recipe(user=self.user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(RECIPES_URL, {'page_size': 1})
+
+        for query in ctx.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_list_recipes_invalid_cursor(self):
+        """Test an invalid cursor returns an error."""
+        res = self.client.get(RECIPES_URL, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_recipes_malformed_cursor_values(self):
+        """Test cursors with values of the wrong type return an error."""
+        for position in [[{'a': 1}], ['abc'], [None], [[1]]]:
+            cursor = b64encode(json.dumps(position).encode()).decode()
+
+            res = self.client.get(RECIPES_URL, {'cursor': cursor})
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_recipe_detail_query_count(self):
+        """Test recipe detail uses a fixed number of queries."""
+        recipe = create_recipe(user=self.user)
+        for i in range(5):
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f'T{i}'))
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f'I{i}')
+            )
+
+        with self.assertNumQueries(4):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(len(res.data['tags']), 5)
+        self.assertEqual(len(res.data['ingredients']), 5)
+
+    def test_list_recipes_not_modified(self):
+        """Test a matching If-None-Match is answered before the list."""
+        create_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+        etag = res['ETag']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(res.content, b'')
+        res = self.client.get(
+            RECIPES_URL, {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_list_recipes_etag_changes_on_write(self):
+        """Test writes to recipes, links and tags change the list ETag."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        etags = [self.client.get(RECIPES_URL)['ETag']]
+
+        recipe.tags.add(tag)
+        etags.append(self.client.get(RECIPES_URL)['ETag'])
+        tag.name = 'Vegetarian'
+        tag.save()
+        etags.append(self.client.get(RECIPES_URL)['ETag'])
+        self.client.patch(
+            RECIPES_URL, [{'id': recipe.id, 'title': 'New'}], format='json',
+        )
+        etags.append(self.client.get(RECIPES_URL)['ETag'])
+        self.client.delete(detail_url(recipe.id))
+        etags.append(self.client.get(RECIPES_URL)['ETag'])
+
+        self.assertEqual(len(set(etags)), len(etags))
+
+    def test_list_recipes_etag_per_user(self):
+        """Test users with the same version do not share list ETags."""
+        other_user = create_user(email='other@example.com', password='test123')
+        etag = self.client.get(RECIPES_URL)['ETag']
+        self.client.force_authenticate(other_user)
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_get_recipe_detail_not_modified(self):
+        """Test recipe details are answered by their own version."""
+        recipe = create_recipe(user=self.user)
+        other = create_recipe(user=self.user)
+        url = detail_url(recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        other.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        with self.assertNumQueries(1):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=f'W/{etag}')
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        tag = Tag.objects.create(user=self.user, name='Quick')
+        recipe.tags.add(tag)
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        etag = res['ETag']
+        tag.delete()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'], [])
+
+    def test_list_recipes_cached(self):
+        """Test lists are served from the cache until a recipe changes."""
+        recipe = create_recipe(user=self.user)
+        stats = cache.stats()
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(1):
+            cached = self.client.get(RECIPES_URL)
+
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.content, res.content)
+        self.assertEqual(cached['ETag'], res['ETag'])
+        recipe.title = 'New title'
+        recipe.save()
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'][0]['title'], 'New title')
+        self.assertEqual(cache.stats()['hit'], stats['hit'] + 1)
+        self.assertEqual(cache.stats()['miss'], stats['miss'] + 2)
+
+    def test_list_recipes_cache_normalizes_filters(self):
+        """Test filters listing the same IDs share a cache entry."""
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Quick')
+
+        self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag2.id},{tag1.id}'})
+        self.assertEqual(res['X-Cache'], 'HIT')
+        res = self.client.get(RECIPES_URL, {'tags': f'0{tag1.id}'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_recipes_cache_per_scheme(self):
+        """Test links cached for http are not served to https clients."""
+        for i in range(3):
+            create_recipe(user=self.user, title=f'Recipe {i}')
+        self.client.get(RECIPES_URL, {'page_size': 2})
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2}, secure=True)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertTrue(res.data['next'].startswith('https://'))
+
+    @override_settings(RESPONSE_CACHE_STALE=30)
+    def test_list_recipes_stale_while_revalidating(self):
+        """Test a stale list is served while another request refreshes."""
+        recipe = create_recipe(user=self.user, title='Old title')
+        etag = self.client.get(RECIPES_URL)['ETag']
+        recipe.title = 'New title'
+        recipe.save()
+        stats = cache.stats()
+
+        with patch('recipe.cache.acquire_lock', return_value=False):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'STALE')
+        self.assertEqual(res['ETag'], etag)
+        results = json.loads(res.content)['results']
+        self.assertEqual(results[0]['title'], 'Old title')
+        self.assertEqual(cache.stats()['stale'], stats['stale'] + 1)
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'][0]['title'], 'New title')
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_list_recipes_cache_disabled(self):
+        """Test lists are not cached with a zero timeout."""
+        self.client.get(RECIPES_URL)
+        res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn('X-Cache', res)
+
+    @patch('recipe.views.EXPORT_CHUNK_SIZE', 2)
+    def test_export_recipes(self):
+        """Test exporting recipes streams one JSON line per recipe."""
+        other_user = create_user(email='other@example.com', password='test123')
+        create_recipe(user=other_user)
+        for i in range(5):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f'T{i}'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(EXPORT_URL)
+            content = b''.join(res.streaming_content)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in content.splitlines()]
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        serializer = RecipeDetailSerializer(recipes, many=True)
+        self.assertEqual(lines, json.loads(json.dumps(serializer.data)))
+        # The cursor plus two prefetches for each chunk of two recipes.
+        self.assertEqual(len(ctx), 1 + 3 * 2)
+
+    def test_import_recipes_csv(self):
+        """Test importing recipes from a CSV body."""
+        Tag.objects.create(user=self.user, name='Vegan')
+        body = (
+            'title,time_minutes,price,tags,ingredients\n'
+            'Soup,10,4.50,vegan|Quick,Salt|Water\n'
+            '"Pie, apple",45,7.00,Vegan,\n'
+        )
+        res = self.client.post(IMPORT_URL, body, content_type='text/csv')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['status'], 'done')
+        self.assertEqual(res.data['rows_done'], 2)
+        soup = Recipe.objects.get(user=self.user, title='Soup')
+        self.assertEqual(soup.price, Decimal('4.50'))
+        self.assertEqual(
+            sorted(tag.name for tag in soup.tags.all()), ['Quick', 'Vegan'],
+        )
+        self.assertEqual(soup.ingredients.count(), 2)
+        pie = Recipe.objects.get(user=self.user, title='Pie, apple')
+        self.assertEqual(list(pie.tags.all()), list(soup.tags.filter(
+            name='Vegan',
+        )))
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_import_recipes_null_marker(self):
+        """Test fields holding the COPY NULL marker load as text."""
+        body = (
+            'title,description,time_minutes,price,link\n'
+            '\\N,\\N,10,4.50,\n'
+        )
+        res = self.client.post(IMPORT_URL, body, content_type='text/csv')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(recipe.title, '\\N')
+        self.assertEqual(recipe.description, '\\N')
+        self.assertEqual(recipe.link, '')
+
+    def test_import_recipes_price_not_finite(self):
+        """Test prices that are not finite numbers fail the import."""
+        for price in ['NaN', 'Infinity', '-inf', 'sNaN']:
+            body = f'title,time_minutes,price\nSoup,10,{price}\n'
+            res = self.client.post(IMPORT_URL, body, content_type='text/csv')
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(res.data['status'], 'failed')
+            self.assertIn('Row 1', res.data['error'])
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    @patch('recipe.importer.BATCH_SIZE', 2)
+    def test_import_recipes_resume(self):
+        """Test a failed import resumes after the last loaded batch."""
+        rows = [
+            {'title': f'Recipe {i}', 'time_minutes': 5, 'price': '1.00'}
+            for i in range(5)
+        ]
+        rows[3]['price'] = 'free'
+        body = '\n'.join(json.dumps(row) for row in rows)
+        res = self.client.post(
+            IMPORT_URL, body, content_type='application/x-ndjson',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['status'], 'failed')
+        self.assertEqual(res.data['rows_done'], 2)
+        self.assertIn('Row 4', res.data['error'])
+
+        rows[3]['price'] = '2.00'
+        body = '\n'.join(json.dumps(row) for row in rows)
+        res = self.client.post(
+            f'{IMPORT_URL}?resume={res.data["id"]}',
+            body,
+            content_type='application/x-ndjson',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['rows_done'], 5)
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('title', flat=True)),
+            [row['title'] for row in rows],
+        )
+
+    def test_import_recipes_unsupported_type(self):
+        """Test importing from an unsupported content type fails."""
+        res = self.client.post(IMPORT_URL, {'title': 'x'}, format='json')
+
+        self.assertEqual(
+            res.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        )
+
     def test_create_recipe(self):
         """Test creating a recipe."""
         payload = {
@@ -207,6 +695,119 @@ class PrivateRecipeApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
         self.assertTrue(Recipe.objects.filter(id=recipe.id).exists())
 
+    def test_bulk_create_recipes(self):
+        """Test creating a list of recipes in one request."""
+        payload = [
+            {
+                'title': f'Recipe {i}',
+                'time_minutes': 10,
+                'price': Decimal('2.50'),
+                'tags': [{'name': 'Vegan'}, {'name': f'Tag {i}'}],
+                'ingredients': [{'name': f'Salt {i}'}],
+            }
+            for i in range(20)
+        ]
+        with CaptureQueriesContext(connection) as small:
+            res = self.client.post(RECIPES_URL, payload[:2], format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        with CaptureQueriesContext(connection) as large:
+            res = self.client.post(RECIPES_URL, payload[2:], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(
+            [recipe['title'] for recipe in res.data],
+            [item['title'] for item in payload[2:]],
+        )
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 20)
+        self.assertEqual(Tag.objects.filter(name='Vegan').count(), 1)
+        for recipe in recipes:
+            self.assertEqual(recipe.tags.count(), 2)
+            self.assertEqual(recipe.ingredients.count(), 1)
+
+    def test_bulk_create_recipes_errors_per_item(self):
+        """Test an invalid item rejects the whole batch."""
+        payload = [
+            {'title': 'Good', 'time_minutes': 5, 'price': Decimal('1.00')},
+            {'title': 'Bad', 'price': Decimal('1.00')},
+        ]
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('time_minutes', res.data[1])
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def test_bulk_partial_update_recipes(self):
+        """Test partially updating a list of recipes."""
+        recipes = [create_recipe(user=self.user) for _ in range(3)]
+        tag = Tag.objects.create(user=self.user, name='Old')
+        recipes[0].tags.add(tag)
+        payload = [
+            {'id': recipes[0].id, 'tags': [{'name': 'New'}]},
+            {'id': recipes[1].id, 'title': 'Renamed'},
+        ]
+        res = self.client.patch(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        for recipe in recipes:
+            recipe.refresh_from_db()
+        self.assertEqual(
+            [tag.name for tag in recipes[0].tags.all()], ['New'],
+        )
+        self.assertEqual(recipes[0].title, 'Sample recipe title')
+        self.assertEqual(recipes[1].title, 'Renamed')
+        self.assertEqual(recipes[2].title, 'Sample recipe title')
+        self.assertEqual(res.data[1]['title'], 'Renamed')
+
+    def test_bulk_partial_update_other_users_recipe(self):
+        """Test bulk update reports recipes of other users per item."""
+        recipe = create_recipe(user=self.user)
+        other = create_recipe(
+            user=create_user(email='user2@example.com', password='test123'),
+        )
+        payload = [
+            {'id': recipe.id, 'title': 'Mine'},
+            {'id': other.id, 'title': 'Theirs'},
+            {'title': 'No ID'},
+        ]
+        res = self.client.patch(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('id', res.data[1])
+        self.assertIn('id', res.data[2])
+        recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(recipe.title, 'Sample recipe title')
+        self.assertEqual(other.title, 'Sample recipe title')
+
+    def test_bulk_destroy_recipes(self):
+        """Test deleting a list of recipes."""
+        recipes = [create_recipe(user=self.user) for _ in range(8)]
+        payload = {'ids': [recipe.id for recipe in recipes[:7]]}
+        res = self.client.delete(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            list(Recipe.objects.values_list('id', flat=True)),
+            [recipes[7].id],
+        )
+
+    def test_bulk_destroy_other_users_recipe(self):
+        """Test bulk delete deletes nothing if any ID is not found."""
+        recipe = create_recipe(user=self.user)
+        other = create_recipe(
+            user=create_user(email='user2@example.com', password='test123'),
+        )
+        payload = {'ids': [recipe.id, other.id]}
+        res = self.client.delete(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(res.data['ids']), [1])
+        self.assertEqual(Recipe.objects.count(), 2)
+
     def test_create_recipe_with_new_tags(self):
         """Test creating a recipe with new tags."""
         payload = {
@@ -253,6 +854,49 @@ class PrivateRecipeApiTests(TestCase):
             ).exists()
             self.assertTrue(exists)
 
+    def test_create_recipe_query_count_constant(self):
+        """Test creating tags and ingredients is batched."""
+        def payload(size, prefix):
+            return {
+                'title': 'Stew',
+                'time_minutes': 60,
+                'price': Decimal('9.00'),
+                'tags': [{'name': f'{prefix}T{i}'} for i in range(size)],
+                'ingredients': [
+                    {'name': f'{prefix}I{i}'} for i in range(size)
+                ],
+            }
+        Tag.objects.create(user=self.user, name='bT0')
+
+        with CaptureQueriesContext(connection) as small:
+            res = self.client.post(RECIPES_URL, payload(2, 'a'), 'json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        with CaptureQueriesContext(connection) as large:
+            res = self.client.post(RECIPES_URL, payload(30, 'b'), 'json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(len(small), len(large))
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.tags.count(), 30)
+        self.assertEqual(recipe.ingredients.count(), 30)
+        self.assertEqual(Tag.objects.filter(name='bT0').count(), 1)
+
+    def test_create_recipe_reuses_tags_ignoring_case(self):
+        """Test tag names match existing tags regardless of case."""
+        tag = Tag.objects.create(user=self.user, name='Thai')
+        payload = {
+            'title': 'Green Curry',
+            'time_minutes': 30,
+            'price': Decimal('6.00'),
+            'tags': [{'name': 'thai'}, {'name': 'THAI'}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(list(recipe.tags.all()), [tag])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
     def test_create_tag_on_update(self):
         """Test create tag when updating a recipe."""
         recipe = create_recipe(user=self.user)
@@ -280,6 +924,48 @@ class PrivateRecipeApiTests(TestCase):
         self.assertIn(tag_lunch, recipe.tags.all())
         self.assertNotIn(tag_breakfast, recipe.tags.all())
 
+    def test_update_recipe_tags_only_writes_changes(self):
+        """Test updating tags keeps links that did not change."""
+        recipe = create_recipe(user=self.user)
+        for name in ['Breakfast', 'Quick']:
+            recipe.tags.add(Tag.objects.create(user=self.user, name=name))
+        through = Recipe.tags.through
+        kept = through.objects.get(recipe=recipe, tag__name='Breakfast')
+
+        payload = {'tags': [{'name': 'Breakfast'}, {'name': 'Vegan'}]}
+        url = detail_url(recipe.id)
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = set(recipe.tags.values_list('name', flat=True))
+        self.assertEqual(names, {'Breakfast', 'Vegan'})
+        self.assertTrue(through.objects.filter(id=kept.id).exists())
+        deletes = [
+            q for q in ctx.captured_queries
+            if q['sql'].startswith('DELETE FROM "core_recipe_tags"')
+        ]
+        self.assertEqual(len(deletes), 1)
+
+    def test_update_recipe_same_tags_no_writes(self):
+        """Test resubmitting the same tags leaves the links untouched."""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Lunch'))
+
+        payload = {'tags': [{'name': 'Lunch'}]}
+        url = detail_url(recipe.id)
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        writes = [
+            q for q in ctx.captured_queries if q['sql'].startswith((
+                'INSERT INTO "core_recipe_tags"',
+                'DELETE FROM "core_recipe_tags"',
+            ))
+        ]
+        self.assertEqual(writes, [])
+
     def test_clear_recipe_tags(self):
         """Test clearing a recipes tags."""
         tag = Tag.objects.create(user=self.user, name='Dessert')
@@ -395,9 +1081,9 @@ class PrivateRecipeApiTests(TestCase):
         s1 = RecipeSerializer(r1)
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
 
     def test_filter_by_ingredients(self):
         """Test filtering recipes by ingredients."""
@@ -415,9 +1101,72 @@ class PrivateRecipeApiTests(TestCase):
         s1 = RecipeSerializer(r1)
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
+
+    def test_filter_by_tags_match_all(self):
+        """Test filtering recipes having every requested tag."""
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Quick')
+        r1 = create_recipe(user=self.user, title='Chickpea Salad')
+        r1.tags.add(tag1, tag2)
+        r2 = create_recipe(user=self.user, title='Tofu Scramble')
+        r2.tags.add(tag1)
+
+        params = {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'}
+        res = self.client.get(RECIPES_URL, params)
+
+        ids = [item['id'] for item in res.data['results']]
+        self.assertEqual(ids, [r1.id])
+
+    def test_filter_by_tags_no_duplicates(self):
+        """Test a recipe matching several tags is returned once."""
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Quick')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag1, tag2)
+
+        params = {'tags': f'{tag1.id},{tag2.id}'}
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, params)
+
+        ids = [item['id'] for item in res.data['results']]
+        self.assertEqual(ids, [recipe.id])
+        sql = ctx.captured_queries[1]['sql']
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('DISTINCT', sql)
+
+    def test_filter_ids_with_spaces(self):
+        """Test whitespace around the commas of ID lists is allowed."""
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Quick')
+        r1 = create_recipe(user=self.user, title='Chickpea Salad')
+        r1.tags.add(tag1)
+        r2 = create_recipe(user=self.user, title='Tofu Scramble')
+        r2.tags.add(tag2)
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag1.id}, {tag2.id}'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = {item['id'] for item in res.data['results']}
+        self.assertEqual(ids, {r1.id, r2.id})
+
+    def test_filter_invalid_ids(self):
+        """Test malformed or oversized ID lists are rejected."""
+        for value in ['abc', '1,,2', '1;2', '-1', '0', '1 2']:
+            res = self.client.get(RECIPES_URL, {'tags': value})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        too_many = ','.join(str(i) for i in range(1, 102))
+        res = self.client.get(RECIPES_URL, {'ingredients': too_many})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_invalid_match(self):
+        """Test an unknown match mode is rejected."""
+        res = self.client.get(RECIPES_URL, {'tags': '1', 'match': 'some'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
 
 class ImageUploadTests(TestCase):
@@ -433,23 +1182,217 @@ class ImageUploadTests(TestCase):
         self.recipe = create_recipe(user=self.user)
 
     def tearDown(self):
+        self.recipe.refresh_from_db()
+        for files in self.recipe.image_variants.values():
+            for name in files.values():
+                self.recipe.image.storage.delete(name)
         self.recipe.image.delete()
 
-    def test_upload_image(self):
-        """Test uploading an image to a recipe."""
-        url = image_upload_url(self.recipe.id)
-        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
-            img = Image.new('RGB', (10, 10))
-            img.save(image_file, format='JPEG')
+    def upload(self, size=(10, 10), mode='RGB', fmt='JPEG', recipe=None):
+        """Upload a generated image to the recipe."""
+        url = image_upload_url((recipe or self.recipe).id)
+        suffix = f'.{fmt.lower()}'
+        with tempfile.NamedTemporaryFile(suffix=suffix) as image_file:
+            img = Image.new(mode, size)
+            img.save(image_file, format=fmt)
             image_file.seek(0)
             payload = {'image': image_file}
-            res = self.client.post(url, payload, format='multipart')
+            return self.client.post(url, payload, format='multipart')
+
+    def test_upload_image(self):
+        """Test uploading an image to a recipe."""
+        res = self.upload()
 
         self.recipe.refresh_from_db()
-        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
         self.assertIn('image', res.data)
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_PROCESSING)
+        self.assertEqual(res.data['image_variants'], {})
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    def test_upload_image_queues_job(self):
+        """Test the image job is submitted once the upload commits."""
+        with patch('recipe.images.runner.submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.upload()
+
+        submit.assert_called_once_with(self.recipe.id)
+
+    def test_process_image_variants(self):
+        """Test processing creates resized WebP and JPEG variants."""
+        self.upload(size=(2000, 1000))
+
+        call_command('process_images', stdout=StringIO())
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_READY)
+        self.assertEqual(
+            set(res.data['image_variants']), {'thumbnail', 'card', 'full'},
+        )
+        self.assertTrue(
+            res.data['image_variants']['card']['webp'].endswith('.webp')
+        )
+        self.recipe.refresh_from_db()
+        storage = self.recipe.image.storage
+        variants = self.recipe.image_variants
+        with Image.open(storage.path(variants['thumbnail']['jpeg'])) as img:
+            self.assertEqual(img.size, (150, 75))
+            self.assertTrue(img.info.get('progressive'))
+        with Image.open(storage.path(variants['full']['webp'])) as img:
+            self.assertEqual(img.format, 'WEBP')
+            self.assertEqual(img.size, (1600, 800))
+
+    def test_process_image_keeps_transparency_in_webp(self):
+        """Test transparent images keep alpha in WebP variants."""
+        self.upload(mode='RGBA', fmt='PNG')
+
+        process_pending()
+
+        self.recipe.refresh_from_db()
+        name = self.recipe.image_variants['card']['webp']
+        with Image.open(self.recipe.image.storage.path(name)) as img:
+            self.assertEqual(img.mode, 'RGBA')
+
+    def test_process_image_failed(self):
+        """Test an image that cannot be decoded is marked as failed."""
+        self.upload()
+        self.recipe.refresh_from_db()
+        with open(self.recipe.image.path, 'wb') as image_file:
+            image_file.write(b'not an image')
+
+        with self.assertLogs('recipe.images', 'ERROR'):
+            process_pending()
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_FAILED)
+        self.assertEqual(self.recipe.image_variants, {})
+
+    def test_process_image_unexpected_error(self):
+        """Test unexpected errors mark the image as failed."""
+        self.upload()
+
+        with patch('recipe.images.encode', side_effect=KeyError('WEBP')), \
+                self.assertLogs('recipe.images', 'ERROR'):
+            call_command('process_images', stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_FAILED)
+        self.assertEqual(process_pending(), 0)
+
+    def test_process_image_without_webp(self):
+        """Test only JPEG variants are made when Pillow lacks WebP."""
+        self.upload()
+
+        with patch('recipe.images.features.check', return_value=False):
+            process_pending()
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        for formats in self.recipe.image_variants.values():
+            self.assertEqual(set(formats), {'jpeg'})
+
+    def test_duplicate_uploads_share_image(self):
+        """Test identical uploads share one file named by its content."""
+        other = create_recipe(user=self.user)
+        self.upload()
+        self.upload(recipe=other)
+
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        name = self.recipe.image.name
+        with self.recipe.image.open('rb') as image_file:
+            digest = hashlib.sha256(image_file.read()).hexdigest()
+        self.assertTrue(name.endswith(f'/{digest}.jpeg'))
+        self.assertEqual(other.image.name, name)
+        self.assertEqual(ImageBlob.objects.get(name=name).ref_count, 2)
+
+        other.delete()
+        self.upload(size=(20, 20))
+
+        self.assertEqual(ImageBlob.objects.get(name=name).ref_count, 0)
+
+    def test_duplicate_upload_reuses_variants(self):
+        """Test processing an image already processed reuses its variants."""
+        other = create_recipe(user=self.user)
+        self.upload()
+        process_pending()
+        self.upload(recipe=other)
+
+        with patch('recipe.images.render_variants') as render_variants:
+            process_pending()
+
+        render_variants.assert_not_called()
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(other.image_status, Recipe.IMAGE_READY)
+        self.assertEqual(other.image_variants, self.recipe.image_variants)
+
+    def test_duplicate_upload_renders_missing_variants(self):
+        """Test variants removed from disk are rendered again on reuse."""
+        other = create_recipe(user=self.user)
+        self.upload()
+        process_pending()
+        self.recipe.refresh_from_db()
+        storage = self.recipe.image.storage
+        card = self.recipe.image_variants['card']['jpeg']
+        storage.delete(card)
+        self.upload(recipe=other)
+
+        process_pending()
+
+        other.refresh_from_db()
+        self.assertEqual(other.image_status, Recipe.IMAGE_READY)
+        self.assertEqual(other.image_variants['card']['jpeg'], card)
+        self.assertTrue(storage.exists(card))
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=100)
+    def test_upload_image_too_large(self):
+        """Test uploads over the byte limit are rejected."""
+        res = self.upload()
+
+        self.assertEqual(
+            res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=99)
+    def test_upload_image_too_many_pixels(self):
+        """Test images over the pixel limit are rejected."""
+        res = self.upload()
+
+        self.assertEqual(
+            res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=64 * 1024 * 1024)
+    def test_upload_image_memory_bounded(self):
+        """Test large uploads are streamed to disk, not held in memory."""
+        image_file = BytesIO()
+        Image.new('RGB', (10, 10)).save(image_file, format='PNG')
+        image_file.write(bytes(32 * 1024 * 1024))
+        image_file.name = 'large.png'
+        image_file.seek(0)
+        request = APIRequestFactory().post(
+            image_upload_url(self.recipe.id),
+            {'image': image_file},
+            format='multipart',
+        )
+        force_authenticate(request, self.user)
+        view = RecipeViewSet.as_view({'post': 'upload_image'})
+
+        tracemalloc.start()
+        try:
+            res = view(request, pk=self.recipe.id)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertLess(peak, 4 * 1024 * 1024)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image.size, image_file.tell())
+
     def test_upload_image_bad_request(self):
         """Test uploading an invalid image."""
         url = image_upload_url(self.recipe.id)
@@ -1,7 +1,9 @@
 """
 Tests for the tags API.
 """
+from base64 import b64encode
 from decimal import Decimal
+import json
 
 from django.contrib.auth import get_user_model
 from django.urls import reverse
@@ -62,7 +64,7 @@ class PrivateTagsApiTests(TestCase):
         tags = Tag.objects.all().order_by('-name')
         serializer = TagSerializer(tags, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_tags_limited_to_user(self):
         """Test list of tags is limited to authenticated user."""
@@ -73,9 +75,78 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
-        self.assertEqual(res.data[0]['id'], tag.id)
+        results = res.data['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['name'], tag.name)
+        self.assertEqual(results[0]['id'], tag.id)
+
+    def test_tags_paginated(self):
+        """Test tags are paged in name order without gaps."""
+        for name in ['Apple', 'Banana', 'Cherry', 'Date']:
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'page_size': 3})
+        names = [tag['name'] for tag in res.data['results']]
+        res = self.client.get(res.data['next'])
+        names += [tag['name'] for tag in res.data['results']]
+
+        self.assertEqual(names, ['Date', 'Cherry', 'Banana', 'Apple'])
+        self.assertIsNone(res.data['next'])
+
+    def test_tags_malformed_cursor_values(self):
+        """Test cursors with values of the wrong type return an error."""
+        for position in [[1, 'x'], ['Apple', None], ['a\x00', 1]]:
+            cursor = b64encode(json.dumps(position).encode()).decode()
+
+            res = self.client.get(TAGS_URL, {'cursor': cursor})
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_retrieve_tags_render_db(self):
+        """Test tags rendered by the database match TagSerializer."""
+        Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Caf\u00e9 "special"')
+
+        res = self.client.get(TAGS_URL, {'render': 'db', 'page_size': 1})
+        data = json.loads(res.content)
+        res = self.client.get(data['next'])
+        data['results'] += json.loads(res.content)['results']
+
+        tags = Tag.objects.all().order_by('-name')
+        serializer = TagSerializer(tags, many=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(data['results'], serializer.data)
+
+    def test_list_tags_not_modified(self):
+        """Test tag lists are answered with 304 until a tag changes."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        etag = self.client.get(TAGS_URL)['ETag']
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.client.patch(detail_url(tag.id), {'name': 'Vegetarian'})
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'][0]['name'], 'Vegetarian')
+
+    def test_list_tags_cached(self):
+        """Test tag lists are cached until a recipe creates a tag."""
+        Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(TAGS_URL, {'assigned_only': 0})
+
+        res = self.client.get(TAGS_URL, {'assigned_only': '00'})
+        self.assertEqual(res['X-Cache'], 'HIT')
+        self.client.post(reverse('recipe:recipe-list'), {
+            'title': 'Soup',
+            'time_minutes': 5,
+            'price': '1.00',
+            'tags': [{'name': 'Quick'}],
+        }, format='json')
+        res = self.client.get(TAGS_URL, {'assigned_only': 0})
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(len(res.data['results']), 2)
 
     def test_update_tag(self):
         """Test updating a tag."""
@@ -89,6 +160,19 @@ class PrivateTagsApiTests(TestCase):
         tag.refresh_from_db()
         self.assertEqual(tag.name, payload['name'])
 
+    def test_update_tag_name_in_use(self):
+        """Test renaming a tag to a name already in use fails."""
+        Tag.objects.create(user=self.user, name='Dessert')
+        tag = Tag.objects.create(user=self.user, name='After Dinner')
+
+        payload = {'name': 'dessert'}
+        url = detail_url(tag.id)
+        res = self.client.patch(url, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'After Dinner')
+
     def test_delete_tag(self):
         """Test deleting a tag."""
         tag = Tag.objects.create(user=self.user, name='Breakfast')
@@ -116,8 +200,8 @@ class PrivateTagsApiTests(TestCase):
 
         s1 = TagSerializer(tag1)
         s2 = TagSerializer(tag2)
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertNotIn(s2.data, res.data['results'])
 
     def test_filtered_tags_unique(self):
         """Test filtered tags returns a unique list."""
@@ -140,4 +224,4 @@ class PrivateTagsApiTests(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
\ No newline at end of file
+        self.assertEqual(len(res.data['results']), 1)
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""
+Streaming upload handling for recipe images.
+
+Uploads are written to a temporary file chunk by chunk and hashed as the
+chunks arrive, so memory stays bounded whatever their size. Files beyond
+IMAGE_UPLOAD_MAX_BYTES are rejected as soon as they cross it, and images
+beyond IMAGE_UPLOAD_MAX_PIXELS or in other formats once their header is
+read, before anything decodes them.
+"""
+import hashlib
+
+from PIL import Image
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+from rest_framework import exceptions, parsers, serializers, status
+
+
+IMAGE_FORMATS = {'GIF', 'JPEG', 'PNG', 'WEBP'}
+
+
+class ImageTooLarge(exceptions.APIException):
+    """Raised when an uploaded image is over the upload limits."""
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Image is too large.'
+    default_code = 'image_too_large'
+
+
+def invalid_image():
+    """Return the error rejecting a file that is not a valid image."""
+    return exceptions.ValidationError({
+        'image': [serializers.ImageField.default_error_messages[
+            'invalid_image'
+        ]],
+    })
+
+
+def check_image_header(file):
+    """Reject an image over the pixel limit or in another format.
+
+    Only the header is read, which is enough for Pillow to know the
+    format and size of an image.
+    """
+    try:
+        with Image.open(file) as img:
+            fmt, (width, height) = img.format, img.size
+    except Image.DecompressionBombError:
+        raise ImageTooLarge()
+    except (OSError, ValueError):
+        raise invalid_image()
+    finally:
+        file.seek(0)
+    if fmt not in IMAGE_FORMATS:
+        raise invalid_image()
+    if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+        raise ImageTooLarge(
+            f'Image has over {settings.IMAGE_UPLOAD_MAX_PIXELS} pixels.'
+        )
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """Stream uploaded files to disk, hashing and checking them.
+
+    Completed files carry the hex SHA-256 of their content as sha256.
+    """
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None,
+    ):
+        """Reject bodies larger than any upload within the limits."""
+        max_length = settings.IMAGE_UPLOAD_MAX_BYTES + \
+            settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        if content_length > max_length:
+            raise ImageTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        """Start writing a file to disk."""
+        super().new_file(*args, **kwargs)
+        self.file = TemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset,
+            self.content_type_extra,
+        )
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        """Hash and write a chunk, unless the file gets too large."""
+        if start + len(raw_data) > settings.IMAGE_UPLOAD_MAX_BYTES:
+            self.file.close()
+            raise ImageTooLarge(
+                f'Image is over {settings.IMAGE_UPLOAD_MAX_BYTES} bytes.'
+            )
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        """Return the written file once its header is checked."""
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.digest.hexdigest()
+        try:
+            check_image_header(self.file)
+        except exceptions.APIException:
+            self.file.close()
+            raise
+
+        return self.file
+
+
+class ImageUploadParser(parsers.MultiPartParser):
+    """Multipart parser streaming uploaded images to disk."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        request.upload_handlers = [ImageUploadHandler(request)]
+
+        return super().parse(stream, media_type, parser_context)
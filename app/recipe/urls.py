@@ -6,12 +6,11 @@ from django.urls import (
     include,
 )
 
-from rest_framework.routers import DefaultRouter
-
 from recipe import views
+from recipe.routers import BulkRouter
 
 
-router = DefaultRouter()
+router = BulkRouter()
 router.register('recipes', views.RecipeViewSet)
 router.register('tags', views.TagViewSet)
 router.register('ingredients', views.IngredientViewSet)
@@ -1,6 +1,24 @@
 """
 Views for the recipe APIs
 """
+from itertools import islice
+import hashlib
+import json
+import re
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Count,
+    Exists,
+    OuterRef,
+    Q,
+    prefetch_related_objects,
+)
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template.response import SimpleTemplateResponse
+from django.utils.http import parse_etags
+
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -13,17 +31,303 @@ from rest_framework import (
     mixins,
     status,
 )
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.decorators import action
+from rest_framework.exceptions import (
+    NotFound,
+    UnsupportedMediaType,
+    ValidationError,
+)
+from rest_framework.generics import get_object_or_404
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
 
+from core import instrumentation
+from core.authentication import CachedTokenAuthentication
 from core.models import (
+    CollectionVersion,
     Recipe,
+    RecipeImport,
     Tag,
     Ingredient,
 )
-from recipe import serializers
+from recipe import cache, images, media, serializers
+from recipe.importer import (
+    READERS,
+    RecipeImporter,
+    RecipeImportError,
+)
+from recipe.pagination import (
+    RecipePagination,
+    RecipeAttrPagination,
+)
+from recipe.readers import (
+    JSONReader,
+    ListReader,
+)
+from recipe.planner import (
+    plan_columns,
+    plan_prefetches,
+    plan_queryset,
+)
+from recipe.uploads import ImageUploadParser
+
+
+MAX_FILTER_IDS = 100
+ID_LIST_RE = re.compile(
+    r'^\s*[1-9][0-9]{0,17}(\s*,\s*[1-9][0-9]{0,17})*\s*$'
+)
+EXPORT_CHUNK_SIZE = 500
+RENDER_PARAMETER = OpenApiParameter(
+    'render',
+    OpenApiTypes.STR, enum=['db'],
+    description='Render the list as JSON inside the database.',
+)
+SPARSE_FIELDS_ACTIONS = ('list', 'retrieve', 'export')
+SPARSE_FIELDS_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='Comma separated list of fields to return.',
+    ),
+    OpenApiParameter(
+        'omit',
+        OpenApiTypes.STR,
+        description='Comma separated list of fields to leave out.',
+    ),
+]
+IMPORT_FORMATS = {
+    'text/csv': 'csv',
+    'application/jsonl': 'jsonl',
+    'application/x-ndjson': 'jsonl',
+}
+
+
+class ConditionalGetMixin:
+    """Viewset mixin answering conditional list and detail requests.
+
+    Lists carry a strong ETag derived from the collection version of the
+    user and details one derived from the version of the object, so an
+    If-None-Match is answered with 304 before the objects are read.
+    """
+    version_field = 'version'
+
+    def get_object_version(self):
+        """Return the version of the requested object, if it exists."""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.get_queryset().prefetch_related(None).filter(**{
+            self.lookup_field: self.kwargs[lookup_url_kwarg],
+        })
+        try:
+            return queryset.values_list(self.version_field, flat=True).first()
+        except (TypeError, ValueError):
+            return None
+
+    def get_collection_version(self):
+        """Return the collection version of the user, read once."""
+        if not hasattr(self, '_collection_version'):
+            self._collection_version = CollectionVersion.objects.get_version(
+                self.request.user.pk
+            )
+
+        return self._collection_version
+
+    def get_version(self):
+        """Return the version the response depends on, if any."""
+        if self.action == 'list':
+            return self.get_collection_version()
+        if self.action == 'retrieve':
+            return self.get_object_version()
+
+        return None
+
+    def get_etag(self, version):
+        """Return the ETag of the response for a version."""
+        key = ':'.join([
+            str(self.request.user.pk),
+            str(version),
+            self.request.get_full_path(),
+            self.request.accepted_media_type,
+        ])
+
+        return f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        """Return 304 if the ETag matches, else the tagged response."""
+        version = self.get_version()
+        if version is None:
+            return handler(request, *args, **kwargs)
+
+        etag = self.get_etag(version)
+        etags = parse_etags(request.headers.get('If-None-Match', ''))
+        if '*' in etags or etag in [tag.replace('W/', '', 1) for tag in etags]:
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED,
+                headers={'ETag': etag},
+            )
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK and \
+                not response.has_header('ETag'):
+            response['ETag'] = etag
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        """List objects, answering conditional requests."""
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve an object, answering conditional requests."""
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class CachedListMixin:
+    """Viewset mixin caching rendered JSON lists per user.
+
+    Entries are fresh while the collection version of the user, read by
+    ConditionalGetMixin, is the one they were rendered at. While one
+    request regenerates an invalidated entry, others are served the stale
+    entry for up to RESPONSE_CACHE_STALE seconds.
+    """
+
+    def normalize_param(self, name, value):
+        """Return the value of a query parameter as used in cache keys.
+
+        Raises ValidationError or ValueError for values the list rejects.
+        """
+        return value
+
+    def get_cache_key(self):
+        """Return the cache key of the list, or None if not cacheable."""
+        if not isinstance(self.request.accepted_renderer, JSONRenderer):
+            return None
+        params = self.request.query_params
+        try:
+            normalized = sorted(
+                (name, self.normalize_param(name, params[name]))
+                for name in params
+            )
+        except (ValidationError, ValueError):
+            return None
+
+        return cache.entry_key(
+            self.request.user.pk,
+            self.basename,
+            self.action,
+            [self.request.scheme, self.request.get_host(), normalized],
+            self.request.accepted_media_type,
+        )
+
+    def list(self, request, *args, **kwargs):
+        """List objects from the response cache when it is fresh."""
+        key = None
+        if settings.RESPONSE_CACHE_TIMEOUT:
+            key = self.get_cache_key()
+        if key is None:
+            return super().list(request, *args, **kwargs)
+
+        version = self.get_collection_version()
+        entry = cache.get_entry(key)
+        if entry is not None:
+            if entry['version'] == version:
+                cache.count('hit')
+                return cache.entry_response(entry, 'HIT')
+            stale = settings.RESPONSE_CACHE_STALE
+            if stale and not cache.acquire_lock(key, stale):
+                cache.count('stale')
+                response = cache.entry_response(entry, 'STALE')
+                response['ETag'] = self.get_etag(entry['version'])
+                return response
+
+        cache.count('miss')
+        self.cache_entry = (key, version)
+
+        return super().list(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Cache the rendered list after a miss."""
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if getattr(self, 'cache_entry', None) is None:
+            return response
+        key, version = self.cache_entry
+        if response.status_code != status.HTTP_200_OK:
+            cache.release_lock(key)
+            return response
+
+        def store(response):
+            cache.set_entry(
+                key, version, response, settings.RESPONSE_CACHE_TIMEOUT,
+            )
+
+        response['X-Cache'] = 'MISS'
+        if isinstance(response, SimpleTemplateResponse):
+            response.add_post_render_callback(store)
+        else:
+            store(response)
+
+        return response
+
+
+class RowListMixin:
+    """Viewset mixin rendering lists from rows instead of instances.
+
+    Lists are rendered by a ListReader, or inside the database by a
+    JSONReader with `?render=db`. Serializers with fields the readers
+    cannot render fall back to the regular list.
+    """
+
+    def get_rows_queryset(self):
+        """Return the queryset to read list rows from."""
+        return self.get_queryset()
+
+    def list(self, request, *args, **kwargs):
+        """List objects, rendered from rows when the fields allow it."""
+        serializer = self.get_serializer()
+        ordering = [
+            field.lstrip('-')
+            for field in getattr(self.paginator, 'ordering', ())
+        ]
+        if request.query_params.get('render') == 'db':
+            reader = JSONReader.for_serializer(serializer)
+            if reader is not None:
+                return self.database_list(reader, ordering)
+
+        reader = ListReader.for_serializer(serializer)
+        if reader is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = reader.queryset(self.get_rows_queryset(), ordering)
+        page = self.paginate_queryset(queryset)
+        rows = list(queryset) if page is None else page
+        with instrumentation.timer('serialize'):
+            data = reader.render(rows)
+        if page is None:
+            return Response(data)
+
+        return self.get_paginated_response(data)
+
+    def database_list(self, reader, ordering):
+        """Return the list with the JSON text built by the database."""
+        queryset = reader.queryset(self.get_rows_queryset(), ordering)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            # The database renders the JSON, so it is counted as db time.
+            content = reader.render(list(queryset))
+        else:
+            next_link = json.dumps(self.paginator.get_next_link())
+            content = (
+                f'{{"next":{next_link},"results":{reader.render(page)}}}'
+            )
+
+        return HttpResponse(content, content_type='application/json')
 
 
 @extend_schema_view(
@@ -39,58 +343,305 @@ from recipe import serializers
                 OpenApiTypes.STR,
                 description='Comma separated list of ingredient IDs to filter',
             ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR, enum=['any', 'all'],
+                description='Match recipes with any (default) or all IDs.',
+            ),
+            *SPARSE_FIELDS_PARAMETERS,
+            RENDER_PARAMETER,
         ]
-    )
+    ),
+    retrieve=extend_schema(parameters=SPARSE_FIELDS_PARAMETERS),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin,
+                    CachedListMixin,
+                    RowListMixin,
+                    viewsets.ModelViewSet):
     """View for manage recipe APIs."""
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipePagination
 
-    def _params_to_ints(self, qs):
-        """Convert a list of strings to integers."""
-        return [int(str_id) for str_id in qs.split(',')]
+    def _params_to_ints(self, qs, param='ids'):
+        """Convert a comma separated list of IDs to unique integers."""
+        if not ID_LIST_RE.match(qs):
+            raise ValidationError(
+                {param: 'Must be a comma separated list of IDs.'}
+            )
+        ids = list(dict.fromkeys(int(str_id) for str_id in qs.split(',')))
+        if len(ids) > MAX_FILTER_IDS:
+            raise ValidationError(
+                {param: f'No more than {MAX_FILTER_IDS} IDs are allowed.'}
+            )
 
-    def get_queryset(self):
-        """Retrieve recipes for authenticated user."""
+        return ids
+
+    def _filter_related(self, queryset, through, column, ids, match):
+        """Filter recipes linked to the IDs through an m2m table."""
+        links = through.objects.filter(**{f'{column}__any': ids})
+        if match == 'all':
+            # Links are unique per (recipe, target), so a plain count of
+            # the matching links equals the number of distinct IDs.
+            matching = links.values('recipe_id').annotate(
+                matched=Count(column),
+            ).filter(matched=len(ids)).values('recipe_id')
+            return queryset.filter(id__in=matching)
+
+        return queryset.filter(
+            Exists(links.filter(recipe_id=OuterRef('pk')))
+        )
+
+    def _user_queryset(self):
+        """Return the filtered recipes of the authenticated user."""
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        match = self.request.query_params.get('match', 'any')
+        if match not in ('any', 'all'):
+            raise ValidationError({'match': 'Must be one of: any, all.'})
         queryset = self.queryset
         if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            tag_ids = self._params_to_ints(tags, 'tags')
+            queryset = self._filter_related(
+                queryset, Recipe.tags.through, 'tag_id', tag_ids, match,
+            )
         if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            ingredient_ids = self._params_to_ints(ingredients, 'ingredients')
+            queryset = self._filter_related(
+                queryset,
+                Recipe.ingredients.through,
+                'ingredient_id',
+                ingredient_ids,
+                match,
+            )
 
         return queryset.filter(
             user=self.request.user
-        ).order_by('-id').distinct()
+        ).order_by('-id')
+
+    def get_queryset(self):
+        """Retrieve recipes for authenticated user."""
+        return plan_queryset(
+            self._user_queryset(),
+            self.action,
+            self.get_serializer(),
+        )
+
+    def get_rows_queryset(self):
+        """Return the recipes to read list rows from."""
+        return self._user_queryset()
 
     def get_serializer_class(self):
         """Return the serializer class for request."""
         if self.action == 'list':
             return serializers.RecipeSerializer
+        elif self.action == 'export':
+            return serializers.RecipeDetailSerializer
+        elif self.action == 'import_recipes':
+            return serializers.RecipeImportSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'bulk_partial_update':
+            return serializers.RecipeBulkUpdateSerializer
+        elif self.action == 'bulk_destroy':
+            return serializers.RecipeBulkDeleteSerializer
 
         return self.serializer_class
 
+    def _field_names(self, param):
+        """Return the field names listed in a query parameter, if any."""
+        value = self.request.query_params.get(param)
+        if value is None:
+            return None
+
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    def normalize_param(self, name, value):
+        """Return ID filters sorted, so their order shares cache keys."""
+        if name in ('tags', 'ingredients'):
+            return ','.join(
+                str(i) for i in sorted(self._params_to_ints(value, name))
+            )
+
+        return value
+
+    def get_serializer(self, *args, **kwargs):
+        """Return the serializer, limited to the requested fields."""
+        if self.action in SPARSE_FIELDS_ACTIONS:
+            kwargs.setdefault('fields', self._field_names('fields'))
+            kwargs.setdefault('omit', self._field_names('omit'))
+
+        return super().get_serializer(*args, **kwargs)
+
     def perform_create(self, serializer):
         """Create a new recipe."""
         serializer.save(user=self.request.user)
 
-    @action(methods=['POST'], detail=True, url_path='upload-image')
+    def _bulk_response(self, recipes, status_code):
+        """Return the recipes in request order, prefetching relations."""
+        serializer = serializers.RecipeDetailSerializer(
+            recipes,
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        prefetch_related_objects(recipes, *plan_prefetches(serializer.child))
+
+        return Response(serializer.data, status=status_code)
+
+    def create(self, request, *args, **kwargs):
+        """Create a recipe, or a list of recipes in bulk."""
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.save(user=self.request.user)
+
+        return self._bulk_response(recipes, status.HTTP_201_CREATED)
+
+    @extend_schema(
+        operation_id='recipe_recipes_bulk_partial_update',
+        request=serializers.RecipeBulkUpdateSerializer(many=True),
+        responses=serializers.RecipeDetailSerializer(many=True),
+    )
+    def bulk_partial_update(self, request, *args, **kwargs):
+        """Partially update a list of recipes in bulk."""
+        ids = []
+        if isinstance(request.data, list):
+            for item in request.data[:serializers.MAX_BULK_ITEMS]:
+                try:
+                    ids.append(int(item['id']))
+                except (KeyError, TypeError, ValueError):
+                    continue
+        recipes = list(
+            Recipe.objects.filter(user=self.request.user, id__any=ids)
+        )
+
+        serializer = self.get_serializer(
+            recipes, data=request.data, many=True, partial=True,
+        )
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.save()
+
+        return self._bulk_response(recipes, status.HTTP_200_OK)
+
+    @extend_schema(
+        operation_id='recipe_recipes_bulk_destroy',
+        request=serializers.RecipeBulkDeleteSerializer,
+        responses={204: None},
+    )
+    def bulk_destroy(self, request, *args, **kwargs):
+        """Delete a list of recipes in bulk."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic(), CollectionVersion.objects.batch():
+            Recipe.objects.filter(
+                user=self.request.user,
+                id__any=serializer.validated_data['ids'],
+            ).delete()
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def _export_lines(self, queryset, serializer):
+        """Yield recipes as JSON lines, prefetching relations per chunk."""
+        renderer = JSONRenderer()
+        prefetches = plan_prefetches(serializer)
+        recipes = queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        while True:
+            chunk = list(islice(recipes, EXPORT_CHUNK_SIZE))
+            if not chunk:
+                return
+            prefetch_related_objects(chunk, *prefetches)
+            for recipe in chunk:
+                data = serializer.to_representation(recipe)
+                yield renderer.render(data) + b'\n'
+
+    @extend_schema(
+        parameters=SPARSE_FIELDS_PARAMETERS,
+        responses=serializers.RecipeDetailSerializer(many=True),
+    )
+    @action(methods=['GET'], detail=False, pagination_class=None)
+    def export(self, request):
+        """Stream all recipes of the user as newline delimited JSON."""
+        serializer = self.get_serializer()
+        queryset = Recipe.objects.filter(user=self.request.user).order_by('id')
+        columns = plan_columns(serializer)
+        if columns is not None:
+            queryset = queryset.only(*columns)
+
+        return StreamingHttpResponse(
+            self._export_lines(queryset, serializer),
+            content_type='application/x-ndjson',
+        )
+
+    @extend_schema(
+        request={
+            content_type: OpenApiTypes.BINARY
+            for content_type in IMPORT_FORMATS
+        },
+        parameters=[
+            OpenApiParameter(
+                'resume',
+                OpenApiTypes.INT,
+                description='ID of a failed import to resume.',
+            ),
+        ],
+    )
+    @action(
+        methods=['POST'],
+        detail=False,
+        url_path='import',
+        pagination_class=None,
+    )
+    def import_recipes(self, request):
+        """Import recipes streamed as CSV or JSONL in the request body."""
+        fmt = IMPORT_FORMATS.get(request.content_type.split(';')[0].strip())
+        if fmt is None:
+            raise UnsupportedMediaType(request.content_type)
+
+        resume = request.query_params.get('resume')
+        if resume:
+            recipe_import = get_object_or_404(
+                RecipeImport.objects.exclude(status=RecipeImport.STATUS_DONE),
+                id=resume,
+                user=self.request.user,
+            )
+        else:
+            recipe_import = RecipeImport.objects.create(user=self.request.user)
+
+        lines = (line.decode('utf-8') for line in request.stream or [])
+        importer = RecipeImporter(recipe_import)
+        status_code = status.HTTP_201_CREATED
+        try:
+            importer.run(READERS[fmt](lines))
+        except RecipeImportError:
+            status_code = status.HTTP_400_BAD_REQUEST
+        recipe_import.rows_per_sec = importer.rows_per_sec
+        serializer = self.get_serializer(recipe_import)
+
+        return Response(serializer.data, status=status_code)
+
+    @extend_schema(responses={202: serializers.RecipeImageSerializer})
+    @action(
+        methods=['POST'],
+        detail=True,
+        url_path='upload-image',
+        parser_classes=[ImageUploadParser],
+    )
     def upload_image(self, request, pk=None):
-        """Upload an image to recipe."""
+        """Upload an image to recipe, queueing its variants."""
         recipe = self.get_object()
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            serializer.save(
+                image_status=Recipe.IMAGE_PROCESSING,
+                image_variants={},
+            )
+            images.enqueue(recipe)
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -103,16 +654,21 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 OpenApiTypes.INT, enum=[0, 1],
                 description='Filter by items assigned to recipes.',
             ),
+            RENDER_PARAMETER,
         ]
     )
 )
-class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
+class BaseRecipeAttrViewSet(ConditionalGetMixin,
+                            CachedListMixin,
+                            RowListMixin,
+                            mixins.DestroyModelMixin,
                             mixins.UpdateModelMixin,
                             mixins.ListModelMixin,
                             viewsets.GenericViewSet):
     """Base viewset for recipe attributes."""
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeAttrPagination
 
     def get_queryset(self):
         """Filter queryset to authenticated user."""
@@ -121,11 +677,30 @@ class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            links = self.queryset.model.recipe_set.through.objects.filter(**{
+                self.queryset.model.recipe_set.field.m2m_reverse_name():
+                    OuterRef('pk'),
+            })
+            queryset = queryset.filter(Exists(links))
 
         return queryset.filter(
             user=self.request.user
-        ).order_by('-name').distinct()
+        ).order_by('-name', '-id')
+
+    def normalize_param(self, name, value):
+        """Return assigned_only as an integer flag."""
+        if name == 'assigned_only':
+            return str(int(bool(int(value))))
+
+        return value
+
+    def perform_update(self, serializer):
+        """Update the object, rejecting names already in use."""
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            raise ValidationError({'name': 'This name is already in use.'})
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -137,4 +712,32 @@ class TagViewSet(BaseRecipeAttrViewSet):
 class IngredientViewSet(BaseRecipeAttrViewSet):
     """Manage ingredients in the database."""
     serializer_class = serializers.IngredientSerializer
-    queryset = Ingredient.objects.all()
\ No newline at end of file
+    queryset = Ingredient.objects.all()
+
+
+@extend_schema(exclude=True)
+class RecipeImageView(APIView):
+    """Serve recipe images and their variants to the owners of recipes."""
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SessionAuthentication,
+    ]
+    permission_classes = [IsAuthenticated]
+
+    def get_references(self, name):
+        """Return the filter of recipes using a file as image or variant."""
+        references = Q(image=name)
+        for variant, size in images.VARIANTS:
+            for fmt, *encoding in images.FORMATS:
+                references |= Q(**{f'image_variants__{variant}__{fmt}': name})
+
+        return references
+
+    def get(self, request, name):
+        """Serve a file if a recipe of the user references it."""
+        if not Recipe.objects.filter(
+            self.get_references(name), user=request.user,
+        ).exists():
+            raise NotFound()
+
+        return media.serve(request, name)
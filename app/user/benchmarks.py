@@ -0,0 +1,86 @@
+"""
+Benchmark scenarios for the user APIs.
+"""
+from threading import Thread
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import override_settings
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from core.benchmark import measure, register
+from user.views.user_views import CreateTokenView
+
+
+LOGIN_THREADS = 8
+PASSWORD = 'benchmark-pass-123'
+
+
+@register('user_login', atomic=False)
+def user_login(options):
+    """Measure sustained logins per second against CreateTokenView.
+
+    Each run is a burst of --rows logins from LOGIN_THREADS threads, with
+    passwords hashed inline and in the hashing pool. Logins run on their
+    own connections, so the scenario commits its user and deletes it
+    afterwards.
+    """
+    rows, repeat = options['rows'], options['repeat']
+    user = get_user_model().objects.create_user(
+        email='benchmark-login@example.com',
+        password=PASSWORD,
+    )
+    Token.objects.create(user=user)
+    view = CreateTokenView.as_view()
+    factory = APIRequestFactory()
+    errors = []
+
+    def login_worker(logins):
+        try:
+            for _ in range(logins):
+                request = factory.post(
+                    '/',
+                    {'email': user.email, 'password': PASSWORD},
+                    format='json',
+                )
+                response = view(request)
+                if response.status_code != status.HTTP_200_OK:
+                    errors.append(response.status_code)
+        finally:
+            connection.close()
+
+    def burst():
+        threads = [
+            Thread(
+                target=login_worker,
+                args=(len(range(i, rows, LOGIN_THREADS)),),
+            )
+            for i in range(LOGIN_THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    results = []
+    try:
+        for label, workers in (
+            ('inline hashing', 0),
+            ('hashing pool', settings.PASSWORD_HASHING_WORKERS or 2),
+        ):
+            with override_settings(PASSWORD_HASHING_WORKERS=workers):
+                results.append(measure(
+                    f'{label} ({rows} logins)', burst, repeat, rows,
+                ))
+    finally:
+        user.delete()
+    if errors:
+        raise RuntimeError(
+            f'{len(errors)} logins failed with status {sorted(set(errors))}.'
+        )
+
+    return results
@@ -3,7 +3,7 @@ from rest_framework.response import Response
 from rest_framework import mixins, viewsets
 from core.models import Address, User
 from user.serializers import AddressSerializer
-from rest_framework.authentication import TokenAuthentication
+from core.authentication import CachedTokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
 class AddressViewSet(mixins.ListModelMixin,
@@ -14,7 +14,7 @@ class AddressViewSet(mixins.ListModelMixin,
 
     queryset = Address.objects.all()
     serializer_class = AddressSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):